@@ -0,0 +1,685 @@
+// クライアント側で絞り込むモード（CLIENT_FILTERING）の図表
+// 選手を選んだときにサーバーから届く列ごとのデータ（client_data.player_payload）から、
+// 日付範囲・Y軸・ゾーンの球種の変更のたびにブラウザ内で図表を作り直す
+// 見た目はfunctions.pyの各関数に合わせている
+(function () {
+    var LEGEND = {orientation: 'h', y: -0.2, x: 0, xanchor: 'left', yanchor: 'top'};
+    var MARGIN = {l: 0, r: 0};
+
+    // 球種の色はサーバーのパレット（functions.set_palette）をデータと一緒に受け取る
+    var palette = {};
+
+    function color(pitchType, fallback) {
+        return palette[pitchType] || fallback || '#CCCCCC';
+    }
+
+    // 列の値（整数で届くので元の桁に戻す。欠損はnull）
+    function value(data, column, i) {
+        var v = data.columns[column][i];
+        return v === null ? null : v / Math.pow(10, data.decimals[column]);
+    }
+
+    // 日付範囲に入る行の番号。日付は日単位で比べる
+    function rows(data, startDate, endDate) {
+        var start = startDate ? startDate.slice(0, 10) : null;
+        var end = endDate ? endDate.slice(0, 10) : null;
+        var result = [];
+        for (var i = 0; i < data.n; i++) {
+            var d = data.dates[data.day[i]];
+            if ((start === null || d >= start) && (end === null || d <= end)) {
+                result.push(i);
+            }
+        }
+        return result;
+    }
+
+    // 球種ごとの行番号（球種は出てきた順）
+    function byType(data, index) {
+        var groups = {};
+        var order = [];
+        index.forEach(function (i) {
+            var code = data.type[i];
+            if (code < 0) {
+                return;
+            }
+            if (!(code in groups)) {
+                groups[code] = [];
+                order.push(code);
+            }
+            groups[code].push(i);
+        });
+        return order.map(function (code) {
+            return {pitchType: data.types[code], index: groups[code]};
+        });
+    }
+
+    function mean(data, column, index) {
+        var sum = 0, n = 0;
+        index.forEach(function (i) {
+            var v = value(data, column, i);
+            if (v !== null) {
+                sum += v;
+                n += 1;
+            }
+        });
+        return n ? sum / n : null;
+    }
+
+    function max(data, column, index) {
+        var result = null;
+        index.forEach(function (i) {
+            var v = value(data, column, i);
+            if (v !== null && (result === null || v > result)) {
+                result = v;
+            }
+        });
+        return result;
+    }
+
+    function round(v, digits) {
+        if (v === null) {
+            return null;
+        }
+        var scale = Math.pow(10, digits);
+        return Math.round(v * scale) / scale;
+    }
+
+    function values(data, column, index) {
+        return index.map(function (i) { return value(data, column, i); });
+    }
+
+    // 欠損を除いた最小値・最大値
+    function extent(data, column, index) {
+        var lo = null, hi = null;
+        index.forEach(function (i) {
+            var v = value(data, column, i);
+            if (v !== null) {
+                lo = lo === null || v < lo ? v : lo;
+                hi = hi === null || v > hi ? v : hi;
+            }
+        });
+        return [lo, hi];
+    }
+
+    function isLarge(data, index) {
+        return index.length > data.large_n;
+    }
+
+    // 球種ごとに層別して点を間引く（functions.downsampleと同じ配分で、球種内は等間隔に抜く）
+    function downsample(data, groups, total) {
+        if (total <= data.max_points) {
+            return groups;
+        }
+        return groups.map(function (group) {
+            var count = group.index.length;
+            var quota = Math.max(Math.ceil(count * data.max_points / total), Math.min(count, data.min_points_per_type));
+            if (quota >= count) {
+                return group;
+            }
+            var kept = [];
+            for (var k = 0; k < quota; k++) {
+                kept.push(group.index[Math.floor(k * count / quota)]);
+            }
+            return {pitchType: group.pitchType, index: kept};
+        });
+    }
+
+    // 球種ごとの散布図のトレース
+    function scatterTraces(data, groups, xColumn, yColumn, large, extra) {
+        return groups.map(function (group) {
+            return Object.assign({
+                type: large ? 'scattergl' : 'scatter',
+                mode: 'markers',
+                name: group.pitchType,
+                legendgroup: group.pitchType,
+                x: values(data, xColumn, group.index),
+                y: values(data, yColumn, group.index),
+                marker: {color: color(group.pitchType)},
+                hovertemplate: '球種=' + group.pitchType + '<br>' + xColumn + '=%{x}<br>' + yColumn + '=%{y}<extra></extra>'
+            }, extra || {});
+        });
+    }
+
+    function line(x0, y0, x1, y1, width) {
+        return {type: 'line', x0: x0, y0: y0, x1: x1, y1: y1, line: {color: 'black', width: width}};
+    }
+
+    // 球種の分布の楕円（pitch_profile.ellipses）。投球数がmin_pitches未満ならnull
+    function ellipse(data, xColumn, yColumn, index) {
+        var n = 0, sx = 0, sy = 0, sxx = 0, syy = 0, sxy = 0;
+        index.forEach(function (i) {
+            var x = value(data, xColumn, i), y = value(data, yColumn, i);
+            if (x !== null && y !== null) {
+                n += 1; sx += x; sy += y; sxx += x * x; syy += y * y; sxy += x * y;
+            }
+        });
+        if (n < data.min_pitches) {
+            return null;
+        }
+        var mx = sx / n, my = sy / n;
+        var a = (sxx - n * mx * mx) / (n - 1), c = (syy - n * my * my) / (n - 1), b = (sxy - n * mx * my) / (n - 1);
+        var halfSum = (a + c) / 2, radius = Math.sqrt(Math.pow((a - c) / 2, 2) + b * b);
+        var major = data.ellipse_scale * Math.sqrt(halfSum + radius);
+        var minor = data.ellipse_scale * Math.sqrt(Math.max(halfSum - radius, 0));
+        var angle = 0.5 * Math.atan2(2 * b, a - c);
+        var xs = [], ys = [];
+        for (var k = 0; k < data.ellipse_points; k++) {
+            var t = 2 * Math.PI * k / (data.ellipse_points - 1);
+            xs.push(mx + major * Math.cos(t) * Math.cos(angle) - minor * Math.sin(t) * Math.sin(angle));
+            ys.push(my + major * Math.cos(t) * Math.sin(angle) + minor * Math.sin(t) * Math.cos(angle));
+        }
+        return {x: xs, y: ys};
+    }
+
+    // 変化量の散布図（functions.mov_plot）
+    function movPlot(data, index, spOrTrj) {
+        var xColumn = 'HB (' + spOrTrj + ')';
+        var yColumn = 'VB (' + spOrTrj + ')';
+        var groups = byType(data, index);
+        var large = isLarge(data, index);
+        var points = large ? downsample(data, groups, index.length) : groups;
+        var traces = scatterTraces(data, points, xColumn, yColumn, large, {opacity: 0.7});
+        // ホバーに日付も出す
+        traces.forEach(function (trace, k) {
+            trace.customdata = points[k].index.map(function (i) { return data.dates[data.day[i]]; });
+            trace.hovertemplate = trace.hovertemplate.replace('<extra>', '<br>日付=%{customdata}<extra>');
+        });
+        groups.forEach(function (group) {
+            traces.push({
+                type: 'scatter', mode: 'markers',
+                x: [mean(data, xColumn, group.index)],
+                y: [mean(data, yColumn, group.index)],
+                marker: {size: 20, color: color(group.pitchType, 'gray'), opacity: 1, line: {width: 1, color: 'black'}},
+                name: group.pitchType + ' 平均',
+                showlegend: false
+            });
+        });
+        // 球種ごとの分布の楕円
+        groups.forEach(function (group) {
+            var path = ellipse(data, xColumn, yColumn, group.index);
+            if (path !== null) {
+                traces.push({
+                    type: 'scatter', mode: 'lines', x: path.x, y: path.y,
+                    line: {color: color(group.pitchType, 'gray'), width: 1.5},
+                    name: group.pitchType + ' 分布', legendgroup: group.pitchType,
+                    showlegend: false, hoverinfo: 'skip'
+                });
+            }
+        });
+        // 外れ値の投球（判定はサーバーの取り込み時に済んでいる）
+        var flags = data.outliers[spOrTrj];
+        var outliers = index.filter(function (i) { return flags[i] === 1; });
+        if (outliers.length) {
+            traces.push({
+                type: large ? 'scattergl' : 'scatter', mode: 'markers',
+                x: values(data, xColumn, outliers), y: values(data, yColumn, outliers),
+                marker: {symbol: 'circle-open', size: 12, color: 'black', line: {width: 1.5}},
+                name: '外れ値',
+                customdata: outliers.map(function (i) { return [data.types[data.type[i]], data.dates[data.day[i]]]; }),
+                hovertemplate: '外れ値<br>球種=%{customdata[0]}<br>日付=%{customdata[1]}<extra></extra>'
+            });
+        }
+        // x=0の縦線とy=0の横線
+        var xs = extent(data, xColumn, index);
+        var ys = extent(data, yColumn, index);
+        var shapes = [];
+        if (xs[0] !== null && ys[0] !== null) {
+            shapes = [line(0, ys[0] - 5, 0, ys[1] + 5, 1), line(xs[0] - 5, 0, xs[1] + 5, 0, 1)];
+        }
+        return {
+            data: traces,
+            layout: {
+                title: {text: spOrTrj + ' based', x: 0.5},
+                xaxis: {title: {text: ''}, dtick: 10},
+                yaxis: {title: {text: ''}, dtick: 10},
+                shapes: shapes,
+                height: 650,
+                legend: LEGEND,
+                margin: MARGIN
+            }
+        };
+    }
+
+    // 投球位置の密度（functions.zone_density_gridと同じグリッド・平滑化）
+    var ZONE_X_RANGE = [-80, 80];
+    var ZONE_Y_RANGE = [0, 170];
+    var ZONE_GRID_SHAPE = [64, 68];
+    var ZONE_SMOOTHING = 2.0;
+
+    function convolve(values, kernel) {
+        var half = (kernel.length - 1) / 2;
+        var result = new Array(values.length).fill(0);
+        for (var i = 0; i < values.length; i++) {
+            var sum = 0;
+            for (var k = -half; k <= half; k++) {
+                var j = i + k;
+                if (j >= 0 && j < values.length) {
+                    sum += values[j] * kernel[half - k];
+                }
+            }
+            result[i] = sum;
+        }
+        return result;
+    }
+
+    function zoneDensityGrid(xs, ys) {
+        var nx = ZONE_GRID_SHAPE[0], ny = ZONE_GRID_SHAPE[1];
+        var dx = (ZONE_X_RANGE[1] - ZONE_X_RANGE[0]) / nx;
+        var dy = (ZONE_Y_RANGE[1] - ZONE_Y_RANGE[0]) / ny;
+        var counts = [];
+        for (var r = 0; r < ny; r++) {
+            counts.push(new Array(nx).fill(0));
+        }
+        for (var i = 0; i < xs.length; i++) {
+            var x = xs[i], y = ys[i];
+            if (x === null || y === null || x < ZONE_X_RANGE[0] || x > ZONE_X_RANGE[1] || y < ZONE_Y_RANGE[0] || y > ZONE_Y_RANGE[1]) {
+                continue;
+            }
+            var cx = Math.min(Math.floor((x - ZONE_X_RANGE[0]) / dx), nx - 1);
+            var cy = Math.min(Math.floor((y - ZONE_Y_RANGE[0]) / dy), ny - 1);
+            counts[cy][cx] += 1;
+        }
+        var half = Math.ceil(3 * ZONE_SMOOTHING);
+        var kernel = [];
+        var total = 0;
+        for (var k = -half; k <= half; k++) {
+            kernel.push(Math.exp(-0.5 * Math.pow(k / ZONE_SMOOTHING, 2)));
+            total += kernel[kernel.length - 1];
+        }
+        kernel = kernel.map(function (w) { return w / total; });
+        // 行（y）ごとにx方向、列（x）ごとにy方向に畳み込む
+        var smoothed = counts.map(function (row) { return convolve(row, kernel); });
+        for (var c = 0; c < nx; c++) {
+            var column = convolve(smoothed.map(function (row) { return row[c]; }), kernel);
+            for (var r2 = 0; r2 < ny; r2++) {
+                smoothed[r2][c] = Math.round(column[r2] * 1000) / 1000;
+            }
+        }
+        var xCenters = [], yCenters = [];
+        for (var a = 0; a < nx; a++) {
+            xCenters.push(ZONE_X_RANGE[0] + dx * (a + 0.5));
+        }
+        for (var b = 0; b < ny; b++) {
+            yCenters.push(ZONE_Y_RANGE[0] + dy * (b + 0.5));
+        }
+        return {x: xCenters, y: yCenters, z: smoothed};
+    }
+
+    // ゾーンプロット（functions.zone_plot）
+    function zonePlot(data, index, plotType) {
+        var traces;
+        if (plotType === 'density') {
+            var grid = zoneDensityGrid(values(data, 'Strike Zone Side', index), values(data, 'Strike Zone Height', index));
+            traces = [{type: 'contour', x: grid.x, y: grid.y, z: grid.z, colorscale: 'Reds', hoverinfo: 'skip'}];
+        } else {
+            var large = isLarge(data, index);
+            var points = large ? downsample(data, [{pitchType: '', index: index}], index.length)[0].index : index;
+            traces = [{
+                type: large ? 'scattergl' : 'scatter', mode: 'markers',
+                x: values(data, 'Strike Zone Side', points),
+                y: values(data, 'Strike Zone Height', points),
+                marker: {color: '#636efa'}
+            }];
+        }
+        return {
+            data: traces,
+            layout: {
+                shapes: [line(-25.3, 45, 25.3, 45, 3), line(-25.3, 107, 25.3, 107, 3),
+                         line(25.3, 45, 25.3, 107, 3), line(-25.3, 45, -25.3, 107, 3)],
+                xaxis: {visible: false, range: [-80, 80]},
+                yaxis: {visible: false, range: [0, 170]},
+                title: {x: 0.5},
+                margin: MARGIN
+            }
+        };
+    }
+
+    // バイオリンプロット（functions.violin_plot）。密度はplotly.jsが計算する
+    // 投球数が多いときは点を描かない
+    function violinPlot(data, index, label) {
+        var large = isLarge(data, index);
+        var traces = byType(data, index).map(function (group) {
+            var ys = values(data, label, group.index);
+            return {
+                type: 'violin', name: group.pitchType, legendgroup: group.pitchType,
+                x: ys.map(function () { return group.pitchType; }),
+                y: ys,
+                box: {visible: true},
+                points: large ? false : 'all',
+                marker: {color: color(group.pitchType)},
+                line: {color: color(group.pitchType)}
+            };
+        });
+        return {
+            data: traces,
+            layout: {
+                title: {text: label, x: 0.5},
+                xaxis: {title: {text: '球種'}},
+                yaxis: {title: {text: label}},
+                violinmode: 'overlay',
+                legend: LEGEND,
+                margin: MARGIN
+            }
+        };
+    }
+
+    // 推移グラフの解像度（summary_cube.pick_resolution）。日付範囲の日数から、点の数が上限以下になる一番細かいもの
+    var PERIOD_DAYS = {day: 1, week: 7, month: 30.44};
+
+    function pickResolution(data, start, end) {
+        var days = (Date.parse(end) - Date.parse(start)) / 86400000 + 1;
+        var resolution = 'day';
+        ['day', 'week', 'month'].some(function (r) {
+            resolution = r;
+            return days / PERIOD_DAYS[r] <= data.trend.max_points;
+        });
+        return resolution;
+    }
+
+    // 日付（YYYY-MM-DD）を、その日を含む週（月曜始まり）・月の初日にする
+    function periodStart(date, resolution) {
+        if (resolution === 'month') {
+            return date.slice(0, 8) + '01';
+        }
+        if (resolution === 'week') {
+            var t = new Date(date + 'T00:00:00Z');
+            t.setUTCDate(t.getUTCDate() - (t.getUTCDay() + 6) % 7);
+            return t.toISOString().slice(0, 10);
+        }
+        return date;
+    }
+
+    // 推移グラフ（functions.line_plot）。区切りごと・球種ごとの平均と、平滑化の線（summary_cube.trend_series）
+    function linePlot(data, index, label, startDate, endDate) {
+        var resolution = 'day';
+        if (index.length) {
+            var start = startDate ? startDate.slice(0, 10) : data.dates[data.day[index[0]]];
+            var end = endDate ? endDate.slice(0, 10) : data.dates[data.day[index[index.length - 1]]];
+            resolution = pickResolution(data, start, end);
+        }
+        var smoothing = data.trend.smoothing;
+        var alpha = 2 / (data.trend.ewm_span + 1);
+        var traces = [];
+        var smoothed = [];
+        byType(data, index).forEach(function (group) {
+            var sums = {}, counts = {}, periods = [];
+            group.index.forEach(function (i) {
+                var v = value(data, label, i);
+                if (v === null) {
+                    return;
+                }
+                var p = periodStart(data.dates[data.day[i]], resolution);
+                if (!(p in sums)) {
+                    sums[p] = 0;
+                    counts[p] = 0;
+                    periods.push(p);
+                }
+                sums[p] += v;
+                counts[p] += 1;
+            });
+            periods.sort();
+            var means = periods.map(function (p) { return sums[p] / counts[p]; });
+            traces.push({
+                type: 'scatter', mode: resolution === 'day' ? 'lines' : 'lines+markers',
+                name: group.pitchType, legendgroup: group.pitchType,
+                x: periods, y: means,
+                line: {color: color(group.pitchType)}
+            });
+
+            // 移動平均は投球数で重み付けし、指数移動平均は区切りごとの平均から（pandasのewm(adjust=True)と同じ）
+            var y = [];
+            var weighted = 0, weights = 0;
+            periods.forEach(function (p, k) {
+                if (smoothing === 'rolling') {
+                    var s = 0, n = 0;
+                    for (var j = Math.max(0, k - data.trend.rolling_window + 1); j <= k; j++) {
+                        s += sums[periods[j]];
+                        n += counts[periods[j]];
+                    }
+                    y.push(s / n);
+                } else {
+                    weighted = weighted * (1 - alpha) + means[k];
+                    weights = weights * (1 - alpha) + 1;
+                    y.push(weighted / weights);
+                }
+            });
+            if (smoothing === 'ewm' || smoothing === 'rolling') {
+                smoothed.push({
+                    type: 'scatter', mode: 'lines', x: periods, y: y,
+                    line: {color: color(group.pitchType), width: 3, dash: 'dot'},
+                    name: group.pitchType + ' 平滑', legendgroup: group.pitchType,
+                    showlegend: false, hoverinfo: 'skip'
+                });
+            }
+        });
+        var title = label + '（' + data.trend.labels[resolution] + '）';
+        return {
+            data: traces.concat(smoothed),
+            layout: {
+                title: {text: title, x: 0.5},
+                xaxis: {title: {text: 'date'}},
+                yaxis: {title: {text: label}},
+                legend: LEGEND,
+                margin: MARGIN
+            }
+        };
+    }
+
+    // リリース位置の散布図（functions.release_plot）
+    function releasePlot(data, index, xColumn, yColumn, xStart, xEnd) {
+        var large = isLarge(data, index);
+        var groups = byType(data, index);
+        var points = large ? downsample(data, groups, index.length) : groups;
+        return {
+            data: scatterTraces(data, points, xColumn, yColumn, large),
+            layout: {
+                title: {text: 'Release Position', x: 0.5},
+                xaxis: {title: {text: xColumn}, range: [xStart, xEnd]},
+                yaxis: {title: {text: yColumn}, range: [0.5, 2.1]},
+                legend: LEGEND,
+                margin: MARGIN
+            }
+        };
+    }
+
+    // リリース角度（functions.release_angle）
+    function releaseAngle(data, index) {
+        var xCircle = [], yCircle = [];
+        for (var k = 0; k < 360; k++) {
+            var theta = -Math.PI / 4 + (Math.PI / 2) * k / 359;
+            xCircle.push(Math.cos(theta));
+            yCircle.push(Math.sin(theta));
+        }
+        var traces = [{
+            type: 'scatter', mode: 'lines', name: 'Unit Circle', x: xCircle, y: yCircle,
+            line: {color: 'lightgray', width: 2}, hoverinfo: 'none'
+        }];
+        byType(data, index).forEach(function (group) {
+            var angle = mean(data, 'Release Angle', group.index);
+            if (angle === null) {
+                return;
+            }
+            var rad = angle * Math.PI / 180;
+            traces.push({
+                type: 'scatter', mode: 'lines', name: group.pitchType, x: [0, Math.cos(rad)], y: [0, Math.sin(rad)],
+                line: {color: color(group.pitchType), width: 3}, showlegend: true
+            });
+            traces.push({
+                type: 'scatter', mode: 'markers', name: group.pitchType + ' Point', x: [Math.cos(rad)], y: [Math.sin(rad)],
+                marker: {size: 8, color: color(group.pitchType)}, showlegend: false, hoverinfo: 'text',
+                text: '球種: ' + group.pitchType + '<br>角度: ' + angle.toFixed(1) + '°'
+            });
+        });
+        return {
+            data: traces,
+            layout: {
+                xaxis: {scaleanchor: 'y', scaleratio: 1, range: [0, 1.2], title: {text: ''}},
+                yaxis: {range: [-0.2, 0.2], title: {text: ''}},
+                showlegend: true,
+                title: {text: 'Release Angle', x: 0.5},
+                margin: MARGIN
+            }
+        };
+    }
+
+    // 平均値テーブル（functions.mean_table・mean_table2）
+    function table(rowsByType) {
+        rowsByType.sort(function (a, b) { return b.N - a.N; });
+        var columns = rowsByType.length ? Object.keys(rowsByType[0]) : [];
+        return [rowsByType, columns.map(function (c) { return {name: c, id: c}; })];
+    }
+
+    function meanTable(data, index) {
+        return table(byType(data, index).map(function (group) {
+            var g = group.index;
+            return {
+                '球種': group.pitchType,
+                'N': g.length,
+                'Velo(Mean)': round(mean(data, 'Velocity', g), 1),
+                'Velo(Max)': round(max(data, 'Velocity', g), 1),
+                'Total_Spin': round(mean(data, 'Total Spin', g), 1),
+                'Spin_Eff': round(mean(data, 'Spin Efficiency (release)', g), 1),
+                'VB(Spin)': round(mean(data, 'VB (spin)', g), 1),
+                'HB(Spin)': round(mean(data, 'HB (spin)', g), 1),
+                'VB(Traj)': round(mean(data, 'VB (trajectory)', g), 1),
+                'HB(Traj)': round(mean(data, 'HB (trajectory)', g), 1)
+            };
+        }));
+    }
+
+    function meanTable2(data, index) {
+        return table(byType(data, index).map(function (group) {
+            var g = group.index;
+            var strikes = g.filter(function (i) { return data.strike[i]; }).length;
+            var vaa = mean(data, 'Vertical Approach Angle', g);
+            return {
+                '球種': group.pitchType,
+                'N': g.length,
+                'Release Height[m]': round(max(data, 'Release Height', g), 2),
+                'Release Side[m]': round(mean(data, 'Release Side', g), 2),
+                'Release Angle[°]': round(mean(data, 'Release Angle', g), 2),
+                'Extension[m]': round(mean(data, 'Release Extension (ft)', g), 2),
+                'VAA[°]': vaa === null ? null : round(0.348 * vaa, 1),
+                'Zone%': round(100 * strikes / g.length, 1)
+            };
+        }));
+    }
+
+    // youtube埋め込み用のURL（functions.get_youtube_embed_url）
+    function youtubeEmbedUrl(link) {
+        if (typeof link !== 'string') {
+            return null;
+        }
+        var id = null;
+        if (link.indexOf('watch?v=') >= 0) {
+            id = link.split('watch?v=').pop().split('&')[0];
+        } else if (link.indexOf('youtu.be/') >= 0) {
+            id = link.split('youtu.be/').pop().split('?')[0];
+        } else if (link.indexOf('youtube.com/embed/') >= 0) {
+            id = link.split('youtube.com/embed/').pop().split('?')[0];
+        }
+        return id ? 'https://www.youtube.com/embed/' + id : null;
+    }
+
+    function div(text) {
+        return {namespace: 'dash_html_components', type: 'Div', props: {children: text}};
+    }
+
+    function noUpdate(count) {
+        var result = [];
+        for (var k = 0; k < count; k++) {
+            result.push(window.dash_clientside.no_update);
+        }
+        return count === 1 ? result[0] : result;
+    }
+
+    // 届いたデータを使える状態にする（データがまだ無ければfalse）
+    function ready(data) {
+        if (!data) {
+            return false;
+        }
+        palette = data.colors || {};
+        return true;
+    }
+
+    // Dashのclientside_callbackから呼ばれる関数（main.pyのサーバー側のコールバックと同じ出力）
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        rapsodo: {
+            update_tables: function (data, startDate, endDate) {
+                if (!ready(data)) {
+                    return noUpdate(4);
+                }
+                var index = rows(data, startDate, endDate);
+                return meanTable(data, index).concat(meanTable2(data, index));
+            },
+            update_movement: function (data, startDate, endDate) {
+                if (!ready(data)) {
+                    return noUpdate(2);
+                }
+                var index = rows(data, startDate, endDate);
+                return [movPlot(data, index, 'spin'), movPlot(data, index, 'trajectory')];
+            },
+            update_release: function (data, startDate, endDate) {
+                if (!ready(data)) {
+                    return noUpdate(3);
+                }
+                var index = rows(data, startDate, endDate);
+                return [
+                    releasePlot(data, index, 'Release Side', 'Release Height', -2, 2),
+                    releaseAngle(data, index),
+                    releasePlot(data, index, 'Release Extension (m)', 'Release Height', 0, 3)
+                ];
+            },
+            update_distribution: function (data, startDate, endDate, yAxis) {
+                if (!ready(data)) {
+                    return noUpdate(2);
+                }
+                var index = rows(data, startDate, endDate);
+                return [violinPlot(data, index, yAxis), linePlot(data, index, yAxis, startDate, endDate)];
+            },
+            update_options: function (data, startDate, endDate) {
+                if (!ready(data)) {
+                    return noUpdate(3);
+                }
+                var index = rows(data, startDate, endDate);
+                var seen = {};
+                var options = [];
+                index.forEach(function (i) {
+                    var d = data.dates[data.day[i]];
+                    if (!seen[d]) {
+                        seen[d] = true;
+                        options.push({label: d, value: d});
+                    }
+                });
+                var pitchTypes = byType(data, index).map(function (group) { return group.pitchType; });
+                return [options, options.length ? options[0].value : null, pitchTypes];
+            },
+            update_video_embed: function (data, selectedDate) {
+                if (!ready(data)) {
+                    return noUpdate(1);
+                }
+                var day = data.dates.indexOf(selectedDate);
+                if (day < 0) {
+                    return div('動画はありません');
+                }
+                var url = youtubeEmbedUrl(data.videos[day]);
+                if (!url) {
+                    return div('動画が登録されていません');
+                }
+                return {
+                    namespace: 'dash_html_components', type: 'Iframe',
+                    props: {src: url, width: '560', height: '315', style: {border: 'none', maxWidth: '100%'}}
+                };
+            },
+            update_zone: function (data, startDate, endDate, pitchType) {
+                if (!ready(data)) {
+                    return noUpdate(2);
+                }
+                var index = rows(data, startDate, endDate).filter(function (i) {
+                    return data.types[data.type[i]] === pitchType;
+                });
+                return [zonePlot(data, index, 'density'), zonePlot(data, index, 'point')];
+            }
+        }
+    });
+})();
@@ -0,0 +1,120 @@
+# メモリ確保のベンチマーク
+#   python benchmarks/allocations.py --sizes 100000 1000000 --output alloc.json
+# tracemallocで、functions.pyの各図表とmain.pyの各コールバック（図表のキャッシュなし）が
+# 一時的に確保したメモリの最大量を測る。あわせて図表の関数が受け取ったデータを書き換えていないかを確認する
+# 結果はrun.pyと同じ形式（memory_bytesが確保量）なので、benchmarks/compare.pyで比較できる
+import argparse
+import datetime
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import run
+import synthetic
+
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+# fnを呼んで (経過時間, 確保したメモリの最大量, 結果) を返す
+def traced(fn):
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+def measure(fn, repeat):
+    times, peaks = [], []
+    for _ in range(repeat):
+        elapsed, peak, _ = traced(fn)
+        times.append(elapsed)
+        peaks.append(peak)
+    return times, min(peaks)
+
+# 列の並び・型・値が同じか確かめるための指紋
+def fingerprint(df):
+    return list(df.columns), list(df.dtypes.astype(str)), int(pd.util.hash_pandas_object(df, index=True).sum())
+
+
+def bench_size(app, size, repeat, results):
+    import data_store
+    import figure_cache
+    import functions
+    import schema
+
+    raw = synthetic.make_frame(size)
+    df = data_store.prepare_frame(schema.apply(raw))
+    dataset = data_store.Dataset(df, 0)
+    name = df['名前'].value_counts().idxmax()
+    selection = (name, df['日付'].min().strftime('%Y-%m-%d'), df['日付'].max().strftime('%Y-%m-%d'))
+    player_df = dataset.slice(*selection)
+    pitch_type = player_df['球種'].value_counts().idxmax()
+
+    before = fingerprint(player_df)
+    for builder_name, build in run.builders(functions, app.color_map):
+        times, peak = measure(lambda: build(player_df), repeat)
+        run.record(results, size, 'alloc', builder_name, times, rows=len(player_df), memory=peak)
+        if fingerprint(player_df) != before:
+            print(f'{builder_name} が受け取ったデータを書き換えています', file=sys.stderr)
+            before = fingerprint(player_df)
+
+    app.store.publish(raw, size)
+    first_date = app.store.dataset.slice(*selection)['日付'].min()
+    for callback_name, call in run.callbacks(app, selection, pitch_type, first_date):
+        def cold():
+            figure_cache.cache.clear()
+            app.store.dataset.clear_caches()
+            return call()
+        times, peak = measure(cold, repeat)
+        run.record(results, size, 'alloc', callback_name, times, rows=len(player_df), memory=peak)
+        # 同じ選手・期間のまま別の図表を作るとき（絞り込み結果と球種ごとの位置は使い回す）
+        def reuse():
+            figure_cache.cache.clear()
+            return call()
+        times, peak = measure(reuse, repeat)
+        run.record(results, size, 'alloc', callback_name + '(reuse)', times, rows=len(player_df), memory=peak)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='図表とコールバックのメモリ確保量の計測')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='結果のJSONの保存先（省略時は標準出力）')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        app = run.load_app(workdir)
+        for size in args.sizes:
+            bench_size(app, size, args.repeat, results)
+
+    report = {
+        'meta': {
+            'revision': run.git_revision(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,128 @@
+# 起動時間のベンチマーク
+#   python benchmarks/cold_start.py --sizes 100000 1000000 --output cold.json
+#   python benchmarks/cold_start.py --server gunicorn --workers 2 --shared   （共有データモード）
+# 合成CSVを読むようにしてアプリのプロセスを起動し、
+#   first_byte: プロセスの起動から最初のページ（/）が返るまで
+#   dashboard_ready: プロセスの起動からダッシュボードのレイアウト（データ読み込み済み）が返るまで
+# を計測する。結果はrun.pyと同じ形式なので、benchmarks/compare.pyで比較できる
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+import run
+import synthetic
+
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def get(url, timeout=5):
+    token = base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode()
+    request = urllib.request.Request(url, headers={'Authorization': f'Basic {token}'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+# urlが応答するまで待ち、起動からの秒数を返す（readyがあれば内容がそれを満たすまで待つ）
+def wait_for(process, start, url, ready=None, timeout=600):
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f'アプリが終了しました (code={process.returncode})')
+        try:
+            body = get(url)
+            if ready is None or ready(body):
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f'{url} が{timeout}秒以内に応答しませんでした')
+
+
+def start_app(server, port, env, workers=1):
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'main:server']
+    else:
+        command = [sys.executable, '-c', f'import main; main.app.run(host="127.0.0.1", port={port})']
+    return subprocess.Popen(command, cwd=run.ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+# sharedなら共有データモード（SHARED_DATA_DIR）で起動する。共有データは毎回空の場所に作り直す
+def bench_size(size, repeat, server, workdir, results, workers=1, shared=False):
+    path = os.path.join(workdir, f'synthetic_{size}.csv')
+    synthetic.make_frame(size).to_csv(path, index=False)
+    env = dict(os.environ, LOCAL_CSV_PATH=path, DATA_RELOAD_INTERVAL='0',
+               DASH_USERNAME=USERNAME, DASH_PASSWORD=PASSWORD)
+    env.pop('SHARED_DATA_DIR', None)
+    label = server + ('+shared' if shared else '')
+
+    first_byte, ready = [], []
+    for i in range(repeat):
+        if shared:
+            env['SHARED_DATA_DIR'] = os.path.join(workdir, f'shared_{size}_{i}')
+        port = free_port()
+        base = f'http://127.0.0.1:{port}'
+        start = time.perf_counter()
+        process = start_app(server, port, env, workers)
+        try:
+            first_byte.append(wait_for(process, start, base + '/'))
+            ready.append(wait_for(process, start, base + '/_dash-layout', lambda body: b'name-dropdown' in body))
+        finally:
+            process.terminate()
+            process.wait()
+    run.record(results, size, 'startup', f'first_byte({label})', first_byte)
+    run.record(results, size, 'startup', f'dashboard_ready({label})', ready)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Rapsodo DashBoard の起動時間のベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--server', choices=['dash', 'gunicorn'], default='dash')
+    parser.add_argument('--workers', type=int, default=1, help='gunicornのワーカー数')
+    parser.add_argument('--shared', action='store_true', help='共有データモード（SHARED_DATA_DIR）で起動する')
+    parser.add_argument('--output', help='結果のJSONの保存先（省略時は標準出力）')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            bench_size(size, args.repeat, args.server, workdir, results, args.workers, args.shared)
+
+    report = {
+        'meta': {
+            'revision': run.git_revision(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,32 @@
+# 2つのベンチマーク結果を比較する
+#   python benchmarks/compare.py before.json after.json
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    return {(r['size'], r['group'], r['name']): r for r in report['results']}
+
+
+def main_cli():
+    if len(sys.argv) != 3:
+        print('usage: python benchmarks/compare.py BEFORE.json AFTER.json', file=sys.stderr)
+        sys.exit(2)
+    before, after = load(sys.argv[1]), load(sys.argv[2])
+    print(f"{'size':>9} {'group':<9} {'name':<28} {'before ms':>10} {'after ms':>10} {'ratio':>7} {'bytes':>12} {'memory MB':>13}")
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key], after[key]
+        ratio = a['median_s'] / b['median_s'] if b['median_s'] else float('nan')
+        size = ''
+        if b['payload_bytes'] is not None and a['payload_bytes'] is not None:
+            size = f"{b['payload_bytes']}→{a['payload_bytes']}"
+        memory = ''
+        if b.get('memory_bytes') is not None and a.get('memory_bytes') is not None:
+            memory = f"{b['memory_bytes'] / 2**20:.1f}→{a['memory_bytes'] / 2**20:.1f}"
+        print(f"{key[0]:>9} {key[1]:<9} {key[2]:<28} {b['median_s']*1000:10.1f} {a['median_s']*1000:10.1f} {ratio:7.2f} {size:>12} {memory:>13}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,84 @@
+# 図表ごとの送信サイズの回帰チェック
+#   python benchmarks/payload_budget.py            # payload_budget.jsonの上限と比べる（超えたら終了コード1）
+#   python benchmarks/payload_budget.py --update   # 今の大きさで上限を書き直す
+# 同じ確認はtests/test_payload_budget.pyとしてpytestでも行う
+# 1選手分の合成データ（通常の描画と大量データ用の描画の2通り）で各図表を作り、
+# ブラウザに送る形（payload.slim後）のJSONの大きさとgzip後の大きさを測る
+import argparse
+import gzip
+import json
+import os
+import sys
+
+import run
+import synthetic
+
+import data_store
+import functions
+import payload
+import schema
+from plotly.utils import PlotlyJSONEncoder
+
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payload_budget.json')
+# 1選手の投球数（LARGE_N_THRESHOLDの下と上）
+SIZES = [3_000, 20_000]
+# 上限に対する許容幅（--updateのときは今の大きさにこの分を足して上限にする）
+TOLERANCE = 0.05
+
+
+# 1選手分の合成データ
+def make_player_frame(size):
+    return data_store.prepare_frame(schema.apply(synthetic.make_frame(size, n_players=1)))
+
+# 図表をブラウザに送る形にしたときの {'json': バイト数, 'gzip': バイト数}
+def measure(build, df):
+    text = json.dumps(payload.slim(build(df)), cls=PlotlyJSONEncoder).encode('utf-8')
+    return {'json': len(text), 'gzip': len(gzip.compress(text, compresslevel=payload.GZIP_LEVEL))}
+
+def load_budget():
+    with open(BUDGET_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+def measure_sizes():
+    color_map = functions.set_palette()
+    sizes = {}
+    for size in SIZES:
+        df = make_player_frame(size)
+        for name, build in run.builders(functions, color_map):
+            sizes[f'{size}/{name}'] = measure(build, df)
+    return sizes
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='図表の送信サイズが上限を超えていないか確認する')
+    parser.add_argument('--update', action='store_true', help='今の大きさで上限を書き直す')
+    args = parser.parse_args()
+
+    sizes = measure_sizes()
+    if args.update:
+        budget = {key: {kind: int(n * (1 + TOLERANCE)) for kind, n in value.items()} for key, value in sizes.items()}
+        with open(BUDGET_PATH, 'w', encoding='utf-8') as f:
+            json.dump(budget, f, ensure_ascii=False, indent=1)
+            f.write('\n')
+        print(f'{BUDGET_PATH} を更新しました')
+        return
+
+    budget = load_budget()
+    failed = False
+    print(f"{'figure':<34} {'json':>9} {'limit':>9} {'gzip':>9} {'limit':>9}")
+    for key, value in sizes.items():
+        limit = budget.get(key)
+        if limit is None:
+            print(f'{key:<34} {value["json"]:>9} {"-":>9} {value["gzip"]:>9} {"-":>9}  (上限なし)')
+            continue
+        over = [kind for kind in ('json', 'gzip') if value[kind] > limit[kind]]
+        failed = failed or bool(over)
+        print(f'{key:<34} {value["json"]:>9} {limit["json"]:>9} {value["gzip"]:>9} {limit["gzip"]:>9}'
+              + (f'  超過: {", ".join(over)}' if over else ''))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
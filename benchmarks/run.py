@@ -0,0 +1,237 @@
+# ダッシュボードのベンチマーク
+#   python benchmarks/run.py --sizes 10000 100000 1000000 --output bench.json
+# 合成データで 取り込み・functions.pyの各図表・main.pyのコールバック を計測し、
+# 時間と図表のJSONサイズをJSONで出力する（benchmarks/compare.pyで比較できる）
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+import synthetic
+
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+
+def measure(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+def payload_bytes(value):
+    return len(json.dumps(value, cls=PlotlyJSONEncoder))
+
+def record(results, size, group, name, times, rows=None, payload=None, memory=None):
+    results.append({
+        'size': size,
+        'group': group,
+        'name': name,
+        'rows': rows,
+        'median_s': statistics.median(times),
+        'min_s': min(times),
+        'repeat': len(times),
+        'payload_bytes': payload,
+        'memory_bytes': memory,
+    })
+    print(f"{size:>9} {group:<9} {name:<28} {statistics.median(times)*1000:10.1f} ms"
+          + (f" {payload:>10} B" if payload is not None else '')
+          + (f" {memory / 2**20:10.1f} MB" if memory is not None else ''), file=sys.stderr)
+
+
+# main.pyをDriveに接続せずに読み込む（小さな合成CSVで起動し、計測時にデータを差し替える）
+def load_app(workdir):
+    path = os.path.join(workdir, 'boot.csv')
+    synthetic.make_frame(200).to_csv(path, index=False)
+    os.environ['LOCAL_CSV_PATH'] = path
+    os.environ['DATA_RELOAD_INTERVAL'] = '0'
+    os.environ['DASH_USERNAME'] = USERNAME
+    os.environ['DASH_PASSWORD'] = PASSWORD
+    os.chdir(ROOT)
+    import main
+    main.store.wait()
+    return main
+
+
+def builders(functions, color_map):
+    return [
+        ('mov_plot(spin)', lambda df: functions.mov_plot(df, 'spin', color_map)),
+        ('mov_plot(trajectory)', lambda df: functions.mov_plot(df, 'trajectory', color_map)),
+        ('release_plot', lambda df: functions.release_plot(df, 'Release Side', 'Release Height', color_map, -2, 2)),
+        ('release_plot(extension)', lambda df: functions.release_plot(df, 'Release Extension (m)', 'Release Height', color_map, 0, 3)),
+        ('release_angle', lambda df: functions.release_angle(df, color_map)),
+        ('violin_plot', lambda df: functions.violin_plot(df, 'Velocity', color_map)),
+        ('line_plot', lambda df: functions.line_plot(df, 'Velocity', color_map)),
+        ('zone_plot(density)', lambda df: functions.zone_plot(df, 'density')),
+        ('zone_plot(point)', lambda df: functions.zone_plot(df, 'point')),
+        ('mean_table', lambda df: functions.mean_table(df).to_dict('records')),
+        ('mean_table2', lambda df: functions.mean_table2(df).to_dict('records')),
+    ]
+
+def callbacks(main, selection, pitch_type, first_date):
+    return [
+        ('update_player_image', lambda: main.update_player_image(selection[0])),
+        ('update_tables', lambda: main.update_tables(*selection)),
+        ('update_movement', lambda: main.update_movement(*selection)),
+        ('update_release', lambda: main.update_release(*selection)),
+        ('update_distribution', lambda: main.update_distribution(*selection, 'Velocity')),
+        ('update_options', lambda: main.update_options(*selection)),
+        ('update_video_embed', lambda: main.update_video_embed(*selection, first_date)),
+        ('update_zone', lambda: main.update_zone(*selection, pitch_type)),
+    ]
+
+
+# よくある操作（ゾーンの球種・Y軸の切り替え）を/_dash-update-componentに送り、レスポンスの大きさを測る
+# full: 選手を選び直したとき（図表全体を送る）、patch: その入力だけを変えたとき（部分更新）
+def interactions(main, selection, pitch_types, y_axes):
+    selection_inputs = [
+        {'id': 'name-dropdown', 'property': 'value', 'value': selection[0]},
+        {'id': 'date-picker-range', 'property': 'start_date', 'value': selection[1]},
+        {'id': 'date-picker-range', 'property': 'end_date', 'value': selection[2]},
+    ]
+    zone_outputs = [{'id': 'zone-plot', 'property': 'figure'}, {'id': 'zone-plot2', 'property': 'figure'}]
+    distribution_outputs = [{'id': 'violin-plot', 'property': 'figure'}, {'id': 'line-plot', 'property': 'figure'}]
+    cases = []
+    for mode, changed in (('full', 'name-dropdown.value'), ('patch', None)):
+        cases.append((f'zone_pt({mode})', zone_outputs, 'zone-pt-dropdown', pitch_types, changed or 'zone-pt-dropdown.value'))
+        cases.append((f'y_axis({mode})', distribution_outputs, 'y-axis-value-dropdown', y_axes, changed or 'y-axis-value-dropdown.value'))
+
+    client = main.server.test_client()
+    token = base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode()
+    headers = {'Authorization': f'Basic {token}'}
+    for name, outputs, component, values, changed in cases:
+        def post(value, name=name, outputs=outputs, component=component, changed=changed):
+            body = {
+                'output': '..' + '...'.join(f"{o['id']}.{o['property']}" for o in outputs) + '..',
+                'outputs': outputs,
+                'inputs': selection_inputs + [{'id': component, 'property': 'value', 'value': value}],
+                'changedPropIds': [changed],
+                'state': [],
+            }
+            response = client.post('/_dash-update-component', json=body, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f'{name}: {response.status_code}')
+            return response.get_data()
+        yield name, post, values
+
+
+def bench_size(main, size, repeat, workdir, results):
+    import data_store
+    import figure_cache
+    import functions
+    import schema
+
+    raw = synthetic.make_frame(size)
+    path = os.path.join(workdir, f'synthetic_{size}.csv')
+    raw.to_csv(path, index=False)
+
+    # 取り込み: CSVの読み込み → 整形 → 索引・集計の作成
+    # read_csvは型指定なし（object/float64）、read_csv_typedはアプリの読み込み方法
+    times, untyped = measure(lambda: pd.read_csv(path), repeat)
+    record(results, size, 'ingest', 'read_csv', times, rows=len(untyped), memory=schema.memory_bytes(untyped))
+    del untyped
+    times, raw = measure(lambda: schema.read_csv(path), repeat)
+    record(results, size, 'ingest', 'read_csv_typed', times, rows=len(raw), memory=schema.memory_bytes(raw))
+    times, df = measure(lambda: data_store.prepare_frame(raw), repeat)
+    record(results, size, 'ingest', 'prepare_frame', times, rows=len(df), memory=schema.memory_bytes(df))
+    times, dataset = measure(lambda: data_store.Dataset(df, 0), repeat)
+    record(results, size, 'ingest', 'dataset_index', times, rows=len(df))
+
+    # 一番投球数の多い選手の全期間を対象にする
+    name = df['名前'].value_counts().idxmax()
+    start_date = df['日付'].min().strftime('%Y-%m-%d')
+    end_date = df['日付'].max().strftime('%Y-%m-%d')
+    player_df = dataset.slice(name, start_date, end_date)
+    pitch_type = player_df['球種'].value_counts().idxmax()
+
+    for builder_name, build in builders(functions, main.color_map):
+        times, value = measure(lambda: build(player_df), repeat)
+        record(results, size, 'builder', builder_name, times, rows=len(player_df), payload=payload_bytes(value))
+
+    main.store.publish(raw, size)
+    selection = (name, start_date, end_date)
+    first_date = main.store.dataset.slice(*selection)['日付'].min()
+    for callback_name, call in callbacks(main, selection, pitch_type, first_date):
+        # キャッシュなし（初回表示）とキャッシュあり（同じ条件の再表示）の両方を測る
+        def cold():
+            figure_cache.cache.clear()
+            main.store.dataset.clear_caches()
+            return call()
+        times, value = measure(cold, repeat)
+        record(results, size, 'callback', callback_name, times, rows=len(player_df), payload=payload_bytes(value))
+        times, value = measure(call, repeat)
+        record(results, size, 'callback', callback_name + '(cached)', times, rows=len(player_df), payload=payload_bytes(value))
+
+    # 図表はキャッシュ済みの状態で、選択肢を順に切り替えたときのレスポンスの大きさ（中央値）
+    pitch_types = player_df['球種'].value_counts().index.tolist()[:4]
+    y_axes = ['Velocity', 'Total Spin', 'VB (trajectory)', 'Release Angle']
+    for name, post, values in interactions(main, selection, pitch_types, y_axes):
+        for value in values:
+            post(value)
+        sizes = []
+        def switch():
+            for value in values:
+                sizes.append(len(post(value)))
+        times, _ = measure(switch, repeat)
+        record(results, size, 'interaction', name, [t / len(values) for t in times], rows=len(player_df),
+               payload=int(statistics.median(sizes)))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Rapsodo DashBoard のベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='結果のJSONの保存先（省略時は標準出力）')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        app = load_app(workdir)
+        for size in args.sizes:
+            bench_size(app, size, args.repeat, workdir, results)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main_cli()
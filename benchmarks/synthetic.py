@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+
+# 球種ごとの典型値（球速, 回転数, 回転効率, VB, HB, リリース角度）
+PITCH_PROFILES = {
+    'ストレート': (138, 2250, 95, 45, 18, -1.0),
+    'ツーシーム': (135, 2150, 90, 32, 32, -1.2),
+    'スライダー': (122, 2350, 35, 5, -20, 0.2),
+    'カット': (130, 2300, 55, 25, -8, -0.5),
+    'カーブ': (110, 2450, 70, -30, -25, 2.5),
+    'チェンジアップ': (120, 1700, 85, 20, 28, -1.5),
+    'フォーク': (125, 1300, 60, 5, 12, -1.3),
+    'シンカー': (127, 1900, 85, 15, 35, -1.4),
+    'シュート': (133, 2100, 88, 28, 35, -1.1),
+}
+# 選手ごとの球種数の範囲
+PITCH_TYPES_PER_PLAYER = (3, 6)
+PITCHES_PER_SESSION = (15, 60)
+
+
+# アプリが読むRapsodoのCSVと同じ列を持つ合成データを作る
+def make_frame(n_rows, n_players=None, seed=0):
+    rng = np.random.default_rng(seed)
+    n_players = n_players or max(5, min(40, n_rows // 2000))
+    names = [f'選手{i:02d}' for i in range(n_players)]
+    pitch_names = list(PITCH_PROFILES)
+    profiles = np.array([PITCH_PROFILES[p] for p in pitch_names], dtype='float64')
+
+    # 選手ごとの持ち球とクセ（球速・リリース位置の個人差）
+    repertoires = [
+        rng.choice(len(pitch_names), size=rng.integers(*PITCH_TYPES_PER_PLAYER, endpoint=True), replace=False)
+        for _ in names
+    ]
+    player_velo = rng.normal(0, 4, n_players)
+    player_side = rng.normal(-0.5, 0.25, n_players)
+    player_height = rng.normal(1.75, 0.1, n_players)
+    player_ext = rng.normal(6.0, 0.3, n_players)
+
+    # 1セッション＝1選手の1日分の投球
+    session_sizes = rng.integers(*PITCHES_PER_SESSION, size=n_rows // PITCHES_PER_SESSION[0] + 1)
+    n_sessions = int(np.searchsorted(np.cumsum(session_sizes), n_rows)) + 1
+    session_sizes = session_sizes[:n_sessions]
+    session_sizes[-1] -= session_sizes.sum() - n_rows
+    session_player = rng.integers(0, n_players, n_sessions)
+    session_day = np.sort(rng.integers(0, 3 * 365, n_sessions))
+    player = np.repeat(session_player, session_sizes)
+    day = np.repeat(session_day, session_sizes)
+
+    # 投球ごとに持ち球の中から球種を選ぶ
+    pitch = np.empty(n_rows, dtype='int64')
+    choice = rng.random(n_rows)
+    for p in range(n_players):
+        rows = np.flatnonzero(player == p)
+        rep = repertoires[p]
+        pitch[rows] = rep[(choice[rows] * len(rep)).astype('int64')]
+
+    profile = profiles[pitch]
+    velo = profile[:, 0] + player_velo[player] + rng.normal(0, 2.5, n_rows)
+    total_spin = profile[:, 1] + rng.normal(0, 120, n_rows)
+    efficiency = np.clip(profile[:, 2] + rng.normal(0, 6, n_rows), 5, 100)
+    vb_spin = profile[:, 3] + rng.normal(0, 5, n_rows)
+    hb_spin = profile[:, 4] + rng.normal(0, 5, n_rows)
+    side = player_side[player] + rng.normal(0, 0.06, n_rows)
+    height = player_height[player] + rng.normal(0, 0.05, n_rows)
+    zone_side = rng.normal(0, 28, n_rows)
+    zone_height = rng.normal(76, 28, n_rows)
+    in_zone = (np.abs(zone_side) <= 25.3) & (zone_height >= 45) & (zone_height <= 107)
+
+    dates = (pd.Timestamp('2023-02-01') + pd.to_timedelta(day, unit='D')).strftime('%Y-%m-%d')
+    video_ids = np.array([f'https://youtu.be/{i:011d}' for i in range(n_sessions)], dtype=object)
+    video = np.repeat(np.where(rng.random(n_sessions) < 0.7, video_ids, None), session_sizes)
+
+    return pd.DataFrame({
+        '名前': np.array(names, dtype=object)[player],
+        '日付': dates,
+        '球種': np.array(pitch_names, dtype=object)[pitch],
+        'Velocity': velo.round(1),
+        'Total Spin': total_spin.round(0),
+        'True Spin (release)': (total_spin * efficiency / 100).round(0),
+        'Spin Efficiency (release)': efficiency.round(1),
+        'VB (trajectory)': (vb_spin + rng.normal(0, 2, n_rows)).round(1),
+        'HB (trajectory)': (hb_spin + rng.normal(0, 2, n_rows)).round(1),
+        'VB (spin)': vb_spin.round(1),
+        'HB (spin)': hb_spin.round(1),
+        'Release Angle': (profile[:, 5] + rng.normal(0, 0.6, n_rows)).round(2),
+        'Release Height': height.round(2),
+        'Release Side': side.round(2),
+        'Horizontal Approach Angle': rng.normal(0, 1.5, n_rows).round(2),
+        'Vertical Approach Angle': (-6 - vb_spin / 12 + rng.normal(0, 0.8, n_rows)).round(2),
+        'Release Extension (ft)': (player_ext[player] + rng.normal(0, 0.2, n_rows)).round(2),
+        'Strike Zone Side': zone_side.round(1),
+        'Strike Zone Height': zone_height.round(1),
+        'Is Strike': np.where(in_zone | (rng.random(n_rows) < 0.1), 'Y', 'N'),
+        'VideoLink': video,
+    })
@@ -0,0 +1,155 @@
+# 平均値テーブルの集計方法のベンチマーク
+#   python benchmarks/table_engine.py --sizes 10000 100000 1000000 --output tables.json
+# 以前の作り方（列ごとにgroupbyする functions.mean_table / mean_table2）と、
+# 列の定義（summary_cube.MEAN_TABLE / MEAN_TABLE2）から1回の集計で作る今の作り方を比べる
+#   legacy/engine: 1選手分の投球データからテーブルを作る
+#   request(...): 1回の表示でテーブル2つと散布図・リリース角度の平均を用意する
+#     per_call は呼び出しごとにキューブを集計し直す（以前のmain.py）、shared はDataset.totalsを使い回す
+# 結果はrun.pyと同じ形式なので、benchmarks/compare.pyで比較できる。両者の表が一致するかも確認する
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+import numpy as np
+import pandas as pd
+
+import run
+import synthetic
+
+import data_store
+import functions
+import pitch_profile
+import summary_cube
+
+
+# ---- 以前の作り方（比較用にそのまま残す） ----
+
+def legacy_mean_table(df):
+    投球数 = df['Velocity'].groupby(df['球種'], observed=True).size()
+    平均球速 = df['Velocity'].groupby(df['球種'], observed=True).mean().round(1)
+    最速 = df['Velocity'].groupby(df['球種'], observed=True).max().round(1)
+    回転数 = df['Total Spin'].groupby(df['球種'], observed=True).mean().round(1)
+    回転効率 = df['Spin Efficiency (release)'].groupby(df['球種'], observed=True).mean().round(1)
+    VB_Spin = df['VB (spin)'].groupby(df['球種'], observed=True).mean().round(1)
+    HB_Spin = df['HB (spin)'].groupby(df['球種'], observed=True).mean().round(1)
+    VB_Trj = df['VB (trajectory)'].groupby(df['球種'], observed=True).mean().round(1)
+    HB_Trj = df['HB (trajectory)'].groupby(df['球種'], observed=True).mean().round(1)
+
+    rap_list = [投球数, 平均球速, 最速, 回転数, 回転効率, VB_Spin, HB_Spin, VB_Trj, HB_Trj]
+    labels = ['N', 'Velo(Mean)', 'Velo(Max)', 'Total_Spin', 'Spin_Eff', 'VB(Spin)', 'HB(Spin)', 'VB(Traj)', 'HB(Traj)']
+    output = pd.DataFrame({label: stat for label, stat in zip(labels, rap_list)})
+    output = output.reset_index()
+    output = output.sort_values(by='N', ascending=False)
+    return output
+
+def legacy_mean_table2(df):
+    N = df['Velocity'].groupby(df['球種'], observed=True).size()
+    RelX = df['Release Side'].groupby(df['球種'], observed=True).mean().round(2)
+    RelZ = df['Release Height'].groupby(df['球種'], observed=True).max().round(2)
+    RelAng = df['Release Angle'].groupby(df['球種'], observed=True).mean().round(2)
+    RelEx = df['Release Extension (ft)'].groupby(df['球種'], observed=True).mean().round(2)
+    VAA = round(0.348*df['Vertical Approach Angle'].groupby(df['球種'], observed=True).mean(), 1)
+    ストライク率 = round(100* df[df['Is Strike']=='Y'].groupby(df['球種'], observed=True).size() / N, 1)
+
+    rap_list = [N, RelZ, RelX, RelAng, RelEx, VAA, ストライク率]
+    labels = ['N', 'Release Height[m]', 'Release Side[m]', 'Release Angle[°]', 'Extension[m]', 'VAA[°]', 'Zone%']
+    output = pd.DataFrame({label: stat for label, stat in zip(labels, rap_list)})
+    output = output.reset_index()
+    output = output.sort_values(by='N', ascending=False)
+    return output
+
+
+# ---- 1回の表示で必要な集計 ----
+
+# 球種ごとの集計を使うもの（テーブル2つ・散布図2つの平均と楕円・リリース角度の平均）
+CONSUMERS = [
+    lambda totals: summary_cube.build_table(totals, summary_cube.MEAN_TABLE),
+    lambda totals: summary_cube.build_table(totals, summary_cube.MEAN_TABLE2),
+    lambda totals: (summary_cube.pitch_type_means(totals, ['HB (spin)', 'VB (spin)']), pitch_profile.ellipses(totals, 'spin')),
+    lambda totals: (summary_cube.pitch_type_means(totals, ['HB (trajectory)', 'VB (trajectory)']), pitch_profile.ellipses(totals, 'trajectory')),
+    lambda totals: summary_cube.pitch_type_means(totals, ['Release Angle']),
+]
+
+# 以前のmain.py: それぞれがキューブを集計し直していた
+def request_per_call(dataset, selection):
+    return [build(dataset.cube.by_pitch_type(*selection)) for build in CONSUMERS]
+
+def request_shared(dataset, selection):
+    dataset.clear_caches()
+    totals = dataset.totals(*selection)
+    return [build(totals) for build in CONSUMERS]
+
+
+# 以前の表と同じか（以前はストライクの無い球種のZone%がNaNだったので0として比べる）
+def mismatches(legacy, engine, spec):
+    legacy = legacy.set_index('球種').fillna({'Zone%': 0})
+    engine = engine.set_index('球種')
+    if list(legacy.index) != list(engine.index) or list(legacy.columns) != list(engine.columns):
+        return ['行または列の並びが違います']
+    found = []
+    for label, _, _, _, decimals in spec:
+        # float32の値を丸めた結果は、丸めの境目で最後の桁が1つずれることがある
+        tolerance = 1e-9 if decimals is None else 10 ** -decimals + 1e-9
+        a, b = legacy[label].astype('float64'), engine[label].astype('float64')
+        bad = ~(np.isclose(a, b, rtol=0, atol=tolerance) | (a.isna() & b.isna()))
+        found += [f'{label}: {pitch_type} {a[pitch_type]} != {b[pitch_type]}' for pitch_type in a.index[bad]]
+    return found
+
+
+def bench_size(size, repeat, results):
+    df = data_store.prepare_frame(synthetic.make_frame(size))
+    dataset = data_store.Dataset(df, 0)
+    name = df['名前'].value_counts().idxmax()
+    selection = (name, df['日付'].min().strftime('%Y-%m-%d'), df['日付'].max().strftime('%Y-%m-%d'))
+    player_df = dataset.slice(*selection)
+
+    for table, legacy, engine, spec in [
+        ('mean_table', legacy_mean_table, functions.mean_table, summary_cube.MEAN_TABLE),
+        ('mean_table2', legacy_mean_table2, functions.mean_table2, summary_cube.MEAN_TABLE2),
+    ]:
+        times, legacy_result = run.measure(lambda: legacy(player_df), repeat)
+        run.record(results, size, 'table', f'legacy:{table}', times, rows=len(player_df))
+        times, engine_result = run.measure(lambda: engine(player_df), repeat)
+        run.record(results, size, 'table', f'engine:{table}', times, rows=len(player_df))
+        for line in mismatches(legacy_result, engine_result, spec):
+            print(f'{size}: {table} が一致しません: {line}', file=sys.stderr)
+
+    times, _ = run.measure(lambda: request_per_call(dataset, selection), repeat)
+    run.record(results, size, 'table', 'request(per_call)', times, rows=len(player_df))
+    times, _ = run.measure(lambda: request_shared(dataset, selection), repeat)
+    run.record(results, size, 'table', 'request(shared)', times, rows=len(player_df))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='平均値テーブルの集計方法の比較')
+    parser.add_argument('--sizes', type=int, nargs='+', default=run.DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='結果のJSONの保存先（省略時は標準出力）')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        bench_size(size, args.repeat, results)
+
+    report = {
+        'meta': {
+            'revision': run.git_revision(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main_cli()
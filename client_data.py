@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import functions
+import pitch_profile
+import schema
+import summary_cube
+
+
+# クライアント側で絞り込むモード（CLIENT_FILTERING）で、選手を選んだときに一度だけブラウザへ送るデータ
+# 日付範囲・Y軸・ゾーンの球種の変更はassets/client_filter.jsがこのデータから図表を作り直す
+
+# 送る計測値と小数点以下の桁数（センサーの精度に合わせて丸め、10^桁数倍した整数で送る）
+COLUMN_DECIMALS = {
+    'Velocity': 1,
+    'Total Spin': 0,
+    'True Spin (release)': 0,
+    'Spin Efficiency (release)': 1,
+    'VB (trajectory)': 1,
+    'HB (trajectory)': 1,
+    'VB (spin)': 1,
+    'HB (spin)': 1,
+    'Release Angle': 2,
+    'Release Height': 2,
+    'Release Side': 2,
+    'Horizontal Approach Angle': 2,
+    'Vertical Approach Angle': 2,
+    'Release Extension (ft)': 2,
+    'Release Extension (m)': 2,
+    'Strike Zone Side': 1,
+    'Strike Zone Height': 1,
+}
+
+
+# 丸めた整数のリスト（欠損はNone）
+def quantize(values, decimals):
+    values = np.asarray(values, dtype='float64')
+    scaled = np.round(values * 10**decimals)
+    missing = np.isnan(scaled)
+    if not missing.any():
+        return scaled.astype('int64').tolist()
+    result = scaled.astype(object)
+    result[missing] = None
+    result[~missing] = scaled[~missing].astype('int64')
+    return result.tolist()
+
+# カテゴリを出てきた順の番号にする（欠損は-1）
+def encode(values):
+    codes, uniques = pd.factorize(values)
+    return codes.tolist(), [str(u) for u in uniques]
+
+
+# 選手の全期間のデータを列ごとの形にする（dfは日付順）
+def player_payload(df):
+    days = df[schema.DATE_COLUMN].dt.strftime('%Y-%m-%d')
+    day_codes, dates = encode(days)
+    type_codes, pitch_types = encode(df['球種'])
+
+    # 動画はその日の最初の投球のリンク（サーバー側のupdate_video_embedと同じ）
+    first_rows = pd.Series(np.arange(len(df))).groupby(np.asarray(day_codes)).first() if len(df) else pd.Series(dtype='int64')
+    links = df['VideoLink'].astype(object).to_numpy()
+    videos = [links[i] if isinstance(links[i], str) else None for i in first_rows.to_numpy()]
+
+    return {
+        'n': len(df),
+        'dates': dates,
+        'day': day_codes,
+        'types': pitch_types,
+        'type': type_codes,
+        'strike': (df['Is Strike'] == 'Y').astype('int8').tolist(),
+        'videos': videos,
+        'columns': {column: quantize(df[column], decimals) for column, decimals in COLUMN_DECIMALS.items()},
+        'decimals': COLUMN_DECIMALS,
+        'colors': functions.set_palette(),
+        'large_n': functions.LARGE_N_THRESHOLD,
+        'max_points': functions.LARGE_N_MAX_POINTS,
+        'min_points_per_type': functions.MIN_POINTS_PER_TYPE,
+        # 外れ値の判定は取り込み時の全期間の分布によるので、判定結果をそのまま送る
+        'outliers': {sp_or_trj: pitch_profile.outliers(df, sp_or_trj).astype('int8').tolist()
+                     for sp_or_trj in pitch_profile.DISTANCE_COLUMNS},
+        'ellipse_scale': float(np.sqrt(pitch_profile.chi2_threshold(pitch_profile.ELLIPSE_PROBABILITY))),
+        'ellipse_points': pitch_profile.ELLIPSE_POINTS,
+        'min_pitches': pitch_profile.MIN_PITCHES,
+        'trend': {
+            'max_points': summary_cube.TREND_MAX_POINTS,
+            'rolling_window': summary_cube.TREND_ROLLING_WINDOW,
+            'ewm_span': summary_cube.TREND_EWM_SPAN,
+            'smoothing': functions.TREND_SMOOTHING,
+            'labels': functions.RESOLUTION_LABELS,
+        },
+    }
@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import schema
+import pitch_profile
+import shared_data
+import summary_cube
+
+
+# 1回の操作で複数のコールバックが同じ絞り込み結果を使い回せるよう、直近の結果を保持する
+SLICE_CACHE_SIZE = 32
+
+
+# 読み込んだCSVを画面で使う形に整形する
+def prepare_frame(raw):
+    return sort_frame(convert_frame(raw))
+
+def convert_frame(raw):
+    # 使う列だけを型付き（カテゴリ・float32）で持つ
+    df = schema.apply(raw).copy()
+    df['Release Extension (m)'] = (0.3048*df['Release Extension (ft)']).astype('float32')
+    return df
+
+# 選手ごと（初出順）に連続したブロックにし、ブロック内は日付順に並べる
+def sort_frame(df):
+    codes, _ = pd.factorize(df['名前'])
+    codes[codes < 0] = len(codes)
+    order = np.lexsort((df['日付'].values, codes))
+    return df.iloc[order].reset_index(drop=True)
+
+
+# 整形済みのデータと集計キューブをまとめて作る
+# 各投球の外れ値の判定に使う距離も、キューブの選手×球種ごとの分布から計算して列に足しておく
+def prepare_dataset(raw):
+    df = prepare_frame(raw)
+    cube = summary_cube.SummaryCube.from_frame(df)
+    return pitch_profile.with_distances(df, cube), cube
+
+# 共有データ（shared_data）をメモリマップして使うローダー
+# 元データの確認と共有データの作り直しは、ロックを取れた1プロセスだけが行う
+def shared_loader(root, load, interval=0):
+    def shared_load(known_version):
+        # まだ共有データが無ければ、最初の1つができるまで待つ
+        # 再読み込みしない設定なら、既にある共有データをそのまま使う
+        first = shared_data.current_name(root) is None
+        if first or interval > 0:
+            shared_data.refresh(root, load, prepare_dataset, block=first, min_interval=interval)
+        result = shared_data.read(root, known_version)
+        if result is None:
+            return None
+        df, version, cube = result
+        return Dataset(df, version, cube)
+    return shared_load
+
+
+# ローダーが返す「今のデータ（base_version）に追加する行だけ」の結果
+class Increment:
+    def __init__(self, raw, version, base_version):
+        self.raw = raw
+        self.version = version
+        self.base_version = base_version
+
+
+# 日付の境界値をTimestampに揃える（未指定ならNone）
+def _to_timestamp(value):
+    if value is None:
+        return None
+    return pd.Timestamp(value).to_datetime64()
+
+
+# ある時点のデータ一式。差し替えは常にこの単位で行い、中身は書き換えない
+class Dataset:
+    def __init__(self, df, version, cube=None):
+        self.df = df
+        self.version = version
+        # 選手×日×球種の集計（追加読み込みでは前回のキューブに足し合わせたものを受け取る）
+        self.cube = cube if cube is not None else summary_cube.SummaryCube.from_frame(df)
+        self.names = df['名前'].dropna().unique()
+
+        # 選手ごとの行範囲 [start, stop) と、二分探索用の日付配列
+        self._bounds = {
+            name: (positions[0], positions[-1] + 1)
+            for name, positions in df.groupby('名前', sort=False, observed=True).indices.items()
+        }
+        self._dates = df['日付'].values
+        self._slices = OrderedDict()
+        self._totals = OrderedDict()
+        self._pitch_type_rows = OrderedDict()
+        self._slices_lock = threading.Lock()
+
+    # 選手と日付範囲で絞り込む。結果は連続した行ブロックで、呼び出し側は書き換えないこと
+    def slice(self, name, start_date=None, end_date=None):
+        return self._remember(self._slices, (name, start_date, end_date), self._slice)
+
+    # 絞り込んだ範囲の球種ごとの集計（SummaryCube.by_pitch_type）
+    # テーブル・散布図の平均と楕円・リリース角度の平均が同じ集計を使い回す。呼び出し側は書き換えないこと
+    def totals(self, name, start_date=None, end_date=None):
+        return self._remember(self._totals, (name, start_date, end_date), self.cube.by_pitch_type)
+
+    # 絞り込んだ範囲の中での、球種ごとの行の位置（{球種: 位置の配列}）
+    # 絞り込み結果を球種でさらに絞るときは、真偽値のマスクで複製を作らずにこの位置で取り出す
+    def pitch_type_rows(self, name, start_date=None, end_date=None):
+        return self._remember(self._pitch_type_rows, (name, start_date, end_date), self._group_pitch_types)
+
+    def _group_pitch_types(self, name, start_date, end_date):
+        return self.slice(name, start_date, end_date).groupby('球種', observed=True, sort=False).indices
+
+    # 保持している絞り込み結果と集計を捨てる（ベンチマークでキャッシュなしの時間を測るとき用）
+    def clear_caches(self):
+        with self._slices_lock:
+            for cache in (self._slices, self._totals, self._pitch_type_rows):
+                cache.clear()
+
+    # 直近SLICE_CACHE_SIZE件の結果を保持する
+    def _remember(self, cache, key, build):
+        with self._slices_lock:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                return cached
+
+        result = build(*key)
+        with self._slices_lock:
+            cache[key] = result
+            if len(cache) > SLICE_CACHE_SIZE:
+                cache.popitem(last=False)
+        return result
+
+    def _slice(self, name, start_date, end_date):
+        bounds = self._bounds.get(name)
+        if bounds is None:
+            return self.df.iloc[0:0]
+        lo, hi = bounds
+        dates = self._dates[lo:hi]
+        start, end = _to_timestamp(start_date), _to_timestamp(end_date)
+        if start is not None:
+            lo, hi = lo + np.searchsorted(dates, start, side='left'), hi
+            dates = self._dates[lo:hi]
+        if end is not None:
+            hi = lo + np.searchsorted(dates, end, side='right')
+        return self.df.iloc[lo:hi]
+
+
+# 最新のDatasetを保持し、バックグラウンドで定期的に読み込み直す
+class DataStore:
+    def __init__(self, load, interval=0, retry=30):
+        # load(known_version) は (生データ, バージョン)・作成済みのDataset・追加分のIncrementのどれかを返し、
+        # 変更がなければNoneを返す
+        self._load = load
+        self.interval = interval
+        # 最初の読み込みに失敗したときに再試行するまでの秒数
+        self.retry = retry
+        self._dataset = None
+        # 最初のデータが揃ったらセットされる。揃うまでの失敗はerrorに残す
+        self._ready = threading.Event()
+        self.error = None
+        self._reload_lock = threading.Lock()
+        self._thread = None
+
+    # コールバックは最初に一度だけ参照し、処理中は同じDatasetを使い続ける
+    @property
+    def dataset(self):
+        return self._dataset
+
+    @property
+    def version(self):
+        dataset = self._dataset
+        return dataset.version if dataset is not None else None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def publish(self, raw, version):
+        df, cube = prepare_dataset(raw)
+        dataset = Dataset(df, version, cube)
+        print(f"データを読み込みました: {len(dataset.df)}行, {schema.memory_bytes(dataset.df) / 2**20:.1f}MB (version={version})")
+        self._set(dataset)
+        return dataset
+
+    # 新しいセッションの行だけを今のデータに追加する（集計も差分だけ更新する）
+    def append(self, raw, version):
+        current = self._dataset
+        if current is None:
+            return self.publish(raw, version)
+        new_rows = convert_frame(raw)
+        cube = current.cube.update(new_rows)
+        # 距離の列は、つないだ後に計算する（ここでは列を揃えるだけ）
+        new_rows = pitch_profile.with_distances(new_rows, cube, names=[])
+        df = sort_frame(schema.concat([current.df, new_rows]))
+        # 追加した選手は球種ごとの分布が変わるので、その選手の行だけ計算し直す
+        df = pitch_profile.with_distances(df, cube, new_rows['名前'].dropna().unique())
+        dataset = Dataset(df, version, cube)
+        self._set(dataset)
+        return dataset
+
+    # 参照の差し替えは一度の代入なので、途中の状態が見えることはない
+    def _set(self, dataset):
+        self._dataset = dataset
+        self.error = None
+        self._ready.set()
+
+    def reload(self):
+        with self._reload_lock:
+            result = self._load(self.version)
+            if result is None:
+                return False
+            if isinstance(result, Dataset):
+                self._set(result)
+            elif isinstance(result, Increment):
+                if result.base_version != self.version:
+                    raise RuntimeError(f"追加分の元のバージョンが現在のデータと一致しません: {result.base_version} != {self.version}")
+                self.append(result.raw, result.version)
+            else:
+                raw, version = result
+                self.publish(raw, version)
+            return True
+
+    # 最初のデータが揃うまで読み込みを繰り返す
+    def _load_first(self):
+        while not self.ready:
+            try:
+                self.reload()
+            except Exception as e:
+                self.error = e
+                print(f"読み込み中にエラーが発生しました: {e}（{self.retry}秒後に再試行します）")
+            if not self.ready:
+                time.sleep(self.retry)
+
+    def _run(self):
+        self._load_first()
+        if self.interval <= 0:
+            return
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self.reload():
+                    print(f"データを更新しました (version={self.version})")
+            except Exception as e:
+                print(f"データの再読み込みに失敗しました: {e}")
+
+    # バックグラウンドで最初の読み込みを行い、interval>0ならその後も定期的に読み込み直す
+    # 呼び出し元は待たずに戻るので、サーバーはデータの準備ができる前に起動できる
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.ready and self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='data-loader', daemon=True)
+        self._thread.start()
@@ -0,0 +1,188 @@
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+# googleのクライアントライブラリは読み込みに時間が掛かるので、Driveを使うときに初めて関数の中で読み込む
+# （ローカルのCSV・フォルダを使う場合や、起動直後のサーバーを待たせないため）
+
+
+SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# ダウンロードの1回あたりのサイズ（バイト）。既定はライブラリと同じ100MB
+CHUNK_SIZE = int(os.getenv('DRIVE_CHUNK_SIZE', str(100 * 1024 * 1024)))
+# 一時的なエラー（5xx・429・通信エラー）の再試行回数。間隔は指数的に伸びる
+RETRIES = int(os.getenv('DRIVE_RETRIES', '5'))
+TIMEOUT = float(os.getenv('DRIVE_TIMEOUT', '60'))
+# APIの接続先を差し替える（テスト用のローカルサーバーなど）
+API_ENDPOINT = os.getenv('DRIVE_API_ENDPOINT')
+# ストリーミング読み込みの1回あたりのサイズと、先読みしておくチャンク数
+# メモリに載る生データは最大で (STREAM_PREFETCH + 1) × STREAM_CHUNK_SIZE 程度
+STREAM_CHUNK_SIZE = int(os.getenv('DRIVE_STREAM_CHUNK_SIZE', str(4 * 1024 * 1024)))
+STREAM_PREFETCH = int(os.getenv('DRIVE_STREAM_PREFETCH', '2'))
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+_credentials = None
+_credentials_lock = threading.Lock()
+# httplib2の接続はスレッドセーフではないので、スレッドごとに1つ作って使い回す
+_local = threading.local()
+
+
+# 認証情報は一度だけ作り、トークンの更新はgoogle-authに任せる
+def credentials():
+    global _credentials
+    if _credentials is None:
+        with _credentials_lock:
+            if _credentials is None:
+                SERVICE_ACCOUNT_JSON = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
+                if SERVICE_ACCOUNT_JSON is None and API_ENDPOINT:
+                    from google.auth.credentials import AnonymousCredentials
+                    _credentials = AnonymousCredentials()
+                else:
+                    from google.oauth2 import service_account
+                    # JSON文字列を辞書に変換
+                    service_account_info = json.loads(SERVICE_ACCOUNT_JSON)
+                    _credentials = service_account.Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    return _credentials
+
+
+# このスレッド用のDriveサービス。同梱のディスカバリー文書を使うのでネットワークには取りに行かない
+def service():
+    drive = getattr(_local, 'service', None)
+    if drive is None:
+        import httplib2
+        import google_auth_httplib2
+        from googleapiclient.discovery import build
+        http = google_auth_httplib2.AuthorizedHttp(credentials(), http=httplib2.Http(timeout=TIMEOUT))
+        client_options = {'api_endpoint': API_ENDPOINT} if API_ENDPOINT else None
+        drive = build('drive', 'v3', http=http, static_discovery=True, cache_discovery=False,
+                      client_options=client_options)
+        _local.service = drive
+    return drive
+
+
+def get_metadata(drive, file_id, fields):
+    return drive.files().get(fileId=file_id, fields=','.join(fields)).execute(num_retries=RETRIES)
+
+# フォルダ直下のファイル（ゴミ箱以外）のメタデータを全ページ分まとめて返す
+def list_folder(drive, folder_id, fields):
+    files = []
+    page_token = None
+    while True:
+        response = drive.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields=f"nextPageToken, files({','.join(fields)})",
+            pageSize=1000, pageToken=page_token,
+        ).execute(num_retries=RETRIES)
+        files.extend(response.get('files', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return files
+
+# ファイルの中身をfhに書き込む
+def download(drive, file_id, fh):
+    from googleapiclient.http import MediaIoBaseDownload
+    request = drive.files().get_media(fileId=file_id)
+    downloader = MediaIoBaseDownload(fh, request, chunksize=CHUNK_SIZE)
+    done = False
+    while not done:
+        status, done = downloader.next_chunk(num_retries=RETRIES)
+    return fh
+
+
+# ダウンロードしたチャンクを順に受け取るだけの書き込み先
+class _ChunkSink:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+
+# ファイルの中身を先頭から読むストリーム。別スレッドでチャンクを先読みするので、
+# 呼び出し側の解析（read_csvなど）とダウンロードが並行して進む
+class DownloadStream(io.RawIOBase):
+    def __init__(self, drive, file_id, chunksize=None, prefetch=None):
+        self._queue = queue.Queue(maxsize=max(1, STREAM_PREFETCH if prefetch is None else prefetch))
+        self._closed_event = threading.Event()
+        self._buffer = b''
+        self._offset = 0
+        self._eof = False
+        # driveを省略した場合は、先読みスレッドが自分用のサービスを作って使う
+        request = drive.files().get_media(fileId=file_id) if drive is not None else None
+        self._thread = threading.Thread(target=self._download, args=(request, file_id, chunksize or STREAM_CHUNK_SIZE),
+                                        name='drive-download', daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._closed_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _download(self, request, file_id, chunksize):
+        try:
+            from googleapiclient.http import MediaIoBaseDownload
+            if request is None:
+                request = service().files().get_media(fileId=file_id)
+            sink = _ChunkSink()
+            downloader = MediaIoBaseDownload(sink, request, chunksize=chunksize)
+            done = False
+            while not done and not self._closed_event.is_set():
+                status, done = downloader.next_chunk(num_retries=RETRIES)
+                for chunk in sink.chunks:
+                    if not self._put(chunk):
+                        return
+                sink.chunks.clear()
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._offset >= len(self._buffer):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            self._buffer, self._offset = item, 0
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+    def close(self):
+        self._closed_event.set()
+        super().close()
+
+
+# 閉じたときに元のストリーム（ダウンロード）も止めるgzip展開
+class _GzipStream(gzip.GzipFile):
+    def __init__(self, stream):
+        super().__init__(fileobj=stream, mode='rb')
+        self._stream = stream
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._stream.close()
+
+
+# ファイルをストリームとして開く。gzip圧縮されていれば展開しながら読む
+def open_stream(drive, file_id, chunksize=None, prefetch=None):
+    stream = io.BufferedReader(DownloadStream(drive, file_id, chunksize, prefetch), buffer_size=64 * 1024)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return _GzipStream(stream)
+    return stream
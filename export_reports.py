@@ -0,0 +1,290 @@
+# 選手ごとのダッシュボードを、印刷・配布用の静的HTMLレポートに書き出す
+#   python export_reports.py                                    # 全選手・全期間を reports/ に書き出す
+#   python export_reports.py --players 山田 佐藤 --start 2024-04-01 --end 2024-09-30 --y-axes Velocity "Total Spin"
+# データはアプリと同じ設定（LOCAL_CSV_PATH / GOOGLE_DRIVE_FILE_ID / フォルダ / SHARED_DATA_DIR）から読む
+# 整形・集計キューブ・外れ値の距離は一度だけ作って共有データ（shared_data）に置き、
+# 各ワーカープロセスはそれをメモリマップして、選手ごとのレポートを並列に作る
+# plotly.jsと画像は各ファイルに埋め込むので、ネットワークの無い環境でもそのまま開ける
+import argparse
+import base64
+import functools
+import html
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import data_store
+import functions
+import import_data
+import payload
+import pitch_profile
+import portraits
+import shared_data
+import summary_cube
+
+
+# 並列に動かすプロセス数（0ならCPUの数）
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '0'))
+# 書き出し先
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'reports')
+# バイオリンプロットと推移グラフに出す指標
+DEFAULT_Y_AXES = ['Velocity']
+
+STYLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'style.css')
+# ダッシュボードのstyle.cssに足す、レポート用の表と見出しの体裁
+REPORT_CSS = '''
+.report-table { border-collapse: collapse; margin: 0 auto 25px auto; }
+.report-table th { background-color: #f2f2f2; font-weight: bold; }
+.report-table th, .report-table td { border: 1px solid #ddd; padding: 4px 10px; text-align: center; }
+.report-period { text-align: center; color: #555; }
+@media print { .plotly-graph-div { break-inside: avoid; } }
+'''
+# 図表の設定（静的なレポートなのでPlotlyのロゴは出さない）
+FIGURE_CONFIG = {'displaylogo': False, 'responsive': True}
+
+
+# ---- 共有データの準備（親プロセスで一度だけ） ----
+
+# SHARED_DATA_DIRがあればアプリと同じ共有データを使い（元データが変わっていれば作り直す）、
+# 無ければworkdirに作る。戻り値は共有データの置き場所
+def prepare_shared(workdir):
+    root = shared_data.SHARED_DATA_DIR or workdir
+    load = import_data.source_loader(incremental=False)
+    shared_data.refresh(root, load, data_store.prepare_dataset, block=True)
+    if shared_data.current_name(root) is None:
+        raise FileNotFoundError(f'データを読み込めませんでした: {root}')
+    return root
+
+
+# ---- ワーカープロセス ----
+
+# ワーカーごとの、メモリマップした共有データ
+_dataset = None
+_color_map = None
+
+def _init_worker(root):
+    global _dataset, _color_map
+    df, version, cube = shared_data.read(root)
+    _dataset = data_store.Dataset(df, version, cube)
+    _color_map = functions.set_palette()
+
+# plotly.jsの本体（各レポートに埋め込む。ワーカーごとに一度だけ読む）
+@functools.lru_cache(maxsize=None)
+def plotly_js():
+    return get_plotlyjs()
+
+@functools.lru_cache(maxsize=None)
+def style_css():
+    with open(STYLE_PATH, encoding='utf-8') as f:
+        return f.read() + REPORT_CSS
+
+
+def figure_html(fig):
+    # 図表はダッシュボードと同じく小さくした形（payload.slim）で埋め込む
+    return pio.to_html(payload.slim(fig), include_plotlyjs=False, full_html=False, validate=False,
+                       config=FIGURE_CONFIG, default_width='100%')
+
+def table_html(table):
+    return table.to_html(index=False, classes='report-table', border=0, na_rep='')
+
+def page_break():
+    return '<div class="page-break"></div>'
+
+def boxes(figures, wrapper, box):
+    return f'<div class="{wrapper}">' + ''.join(f'<div class="{box}">{figure_html(fig)}</div>' for fig in figures) + '</div>'
+
+def portrait_html(name):
+    portrait = portraits.get_portrait(name)
+    if portrait is None:
+        return ''
+    data = base64.b64encode(portrait[0]).decode('ascii')
+    return (f'<div class="image-display-container"><img src="data:image/png;base64,{data}" '
+            f'style="width: 200px; height: 200px; object-fit: cover; display: block; margin: 0 auto;"></div>')
+
+
+# 1選手分のレポートの本文。図表と表は main.py のコールバックと同じ関数・同じ集計から作る
+def report_sections(dataset, selection, y_axes, color_map):
+    df = dataset.slice(*selection)
+    # 球種ごとの集計は、表・散布図の平均と楕円・リリース角度の平均で共有する
+    totals = dataset.totals(*selection)
+    sections = []
+
+    sections.append('<h2>球種別 平均値</h2>')
+    sections.append(table_html(summary_cube.build_table(totals, summary_cube.MEAN_TABLE)))
+    sections.append(table_html(summary_cube.build_table(totals, summary_cube.MEAN_TABLE2)))
+    sections.append(page_break())
+
+    sections.append('<h2>変化量 散布図</h2>')
+    movement = []
+    for sp_or_trj in ['spin', 'trajectory']:
+        means = summary_cube.pitch_type_means(totals, [f'HB ({sp_or_trj})', f'VB ({sp_or_trj})'])
+        movement.append(functions.mov_plot(df, sp_or_trj, color_map, means, pitch_profile.ellipses(totals, sp_or_trj)))
+    sections.append(boxes(movement, 'scatter-wrapper', 'scatter-plot-box'))
+    sections.append(page_break())
+
+    # 投球位置は、ダッシュボードで球種を選ぶ代わりに投球数の多い順にすべての球種を並べる
+    sections.append('<h2>投球位置 散布図</h2>')
+    rows = dataset.pitch_type_rows(*selection)
+    for pitch_type in sorted(rows, key=lambda pt: -len(rows[pt])):
+        sections.append(f'<h3>{html.escape(str(pitch_type))}</h3>')
+        sections.append(boxes([functions.zone_plot(df, 'density', rows[pitch_type]),
+                               functions.zone_plot(df, 'point', rows[pitch_type])], 'scatter-wrapper', 'scatter-plot-box'))
+    sections.append(page_break())
+
+    sections.append('<h2>リリース位置</h2>')
+    sections.append(boxes([
+        functions.release_plot(df, 'Release Side', 'Release Height', color_map, -2, 2),
+        functions.release_angle(df, color_map, summary_cube.pitch_type_means(totals, ['Release Angle'])),
+    ], 'release-wrapper', 'release-plot-box'))
+    sections.append(page_break())
+    sections.append(boxes([functions.release_plot(df, 'Release Extension (m)', 'Release Height', color_map, 0, 3)],
+                          'release-wrapper', 'release-plot-box'))
+    sections.append(page_break())
+
+    sections.append('<h2>球種別 バイオリンプロット & 推移グラフ</h2>')
+    for y_axis in y_axes:
+        sections.append(figure_html(functions.violin_plot(df, y_axis, color_map)))
+        sections.append(page_break())
+        sections.append(figure_html(functions.line_plot(df, y_axis, color_map, *dataset.cube.trend(*selection, y_axis))))
+        sections.append(page_break())
+    return sections
+
+def report_page(name, period, sections):
+    return f'''<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(name)} - Rapsodo Report</title>
+<style>{style_css()}</style>
+<script type="text/javascript">{plotly_js()}</script>
+</head>
+<body>
+<div class="dash-container">
+<h1>Rapsodo Report</h1>
+<h2>{html.escape(name)}</h2>
+<p class="report-period">{html.escape(period)}</p>
+{portrait_html(name)}
+{''.join(sections)}
+</div>
+</body>
+</html>
+'''
+
+def period_label(dataset, selection):
+    dates = dataset.slice(*selection)['日付']
+    return f"{dates.min():%Y-%m-%d} 〜 {dates.max():%Y-%m-%d}（{len(dates)}球）"
+
+# 選手名をファイル名に使える形にする
+def report_filename(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') + '.html'
+
+# 1選手分のレポートを書き出す。戻り値は (ファイル名, 投球数, 秒数)。投球が無ければファイル名はNone
+def export_player(name, start_date, end_date, y_axes, output_dir):
+    started = time.perf_counter()
+    selection = (name, start_date, end_date)
+    pitches = len(_dataset.slice(*selection))
+    if pitches == 0:
+        return None, 0, time.perf_counter() - started
+    page = report_page(name, period_label(_dataset, selection),
+                       report_sections(_dataset, selection, y_axes, _color_map))
+    filename = report_filename(name)
+    path = os.path.join(output_dir, filename)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(page)
+    os.replace(path + '.tmp', path)
+    return filename, pitches, time.perf_counter() - started
+
+
+# ---- 一覧ページ ----
+
+def write_index(output_dir, reports, period):
+    items = ''.join(f'<li><a href="{html.escape(filename)}">{html.escape(name)}</a>（{pitches}球）</li>'
+                    for name, filename, pitches in reports)
+    page = f'''<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>Rapsodo Report</title>
+<style>{style_css()}</style>
+</head>
+<body>
+<div class="dash-container">
+<h1>Rapsodo Report</h1>
+<p class="report-period">{html.escape(period)}</p>
+<ul>{items}</ul>
+</div>
+</body>
+</html>
+'''
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+
+
+def date_argument(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='選手ごとのレポートを静的HTMLに書き出す')
+    parser.add_argument('--output', default=EXPORT_DIR, help=f'書き出し先のフォルダ（既定: {EXPORT_DIR}）')
+    parser.add_argument('--players', nargs='+', help='書き出す選手（省略時は全選手）')
+    parser.add_argument('--start', type=date_argument, help='期間の初日（YYYY-MM-DD）')
+    parser.add_argument('--end', type=date_argument, help='期間の最終日（YYYY-MM-DD）')
+    parser.add_argument('--y-axes', nargs='+', default=DEFAULT_Y_AXES, help='バイオリンプロットと推移グラフの指標')
+    parser.add_argument('--workers', type=int, default=EXPORT_WORKERS, help='プロセス数（0ならCPUの数）')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        root = prepare_shared(workdir)
+        df, _, _ = shared_data.read(root)
+        names = df['名前'].dropna().unique().tolist()
+        if args.players:
+            for name in args.players:
+                if name not in names:
+                    print(f"選手が見つかりません: {name}")
+            names = [name for name in args.players if name in names]
+        unknown_axes = [y_axis for y_axis in args.y_axes if y_axis not in df.columns]
+        if unknown_axes:
+            print(f"指標が見つかりません: {', '.join(unknown_axes)}")
+            sys.exit(2)
+        del df
+        if not names:
+            print("書き出す選手がいません")
+            sys.exit(1)
+
+        os.makedirs(args.output, exist_ok=True)
+        workers = min(args.workers or os.cpu_count() or 1, len(names))
+        reports, failed = {}, []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(root,)) as pool:
+            futures = {pool.submit(export_player, name, args.start, args.end, args.y_axes, args.output): name
+                       for name in names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    filename, pitches, seconds = future.result()
+                except Exception as e:
+                    print(f"{name} のレポートの作成に失敗しました: {e}")
+                    failed.append(name)
+                    continue
+                if filename is None:
+                    print(f"{name}: 期間内の投球がありません")
+                    continue
+                reports[name] = (filename, pitches)
+                print(f"{name}: {filename}（{pitches}球, {seconds:.1f}秒）")
+
+    period = f"{args.start or '最初'} 〜 {args.end or '最後'}"
+    write_index(args.output, [(name, *reports[name]) for name in names if name in reports], period)
+    print(f"{len(reports)}人分のレポートを {args.output} に書き出しました（{workers}プロセス, {time.perf_counter() - started:.1f}秒）")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from plotly.utils import PlotlyJSONEncoder
+
+
+# メモリ上のキャッシュの上限（MB）
+MEMORY_LIMIT_MB = float(os.getenv('FIGURE_CACHE_MB', '64'))
+# ワーカー間で共有するSQLiteファイル（未設定ならメモリのみ）
+SHARED_PATH = os.getenv('FIGURE_CACHE_PATH')
+SHARED_LIMIT_MB = float(os.getenv('FIGURE_CACHE_SHARED_MB', '512'))
+
+
+# 引数とデータバージョンからキーを作る（ワーカー間で同じ値になるよう文字列から作る）
+def make_key(name, args, version):
+    raw = json.dumps([name, list(args), version], ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# 複数ワーカーで共有するSQLiteのキャッシュ
+class SQLiteBackend:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS figures '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        # sqlite3の接続はスレッドをまたいで使えないので、スレッドごとに持つ
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT value FROM figures WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute('UPDATE figures SET used = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def set(self, key, text):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO figures (key, value, size, used) VALUES (?, ?, ?, ?)',
+                (key, text, len(text), time.time())
+            )
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM figures').fetchone()[0]
+            if total > self.max_bytes:
+                # 使われていない順に、上限の8割まで削る
+                excess = total - int(self.max_bytes * 0.8)
+                conn.execute(
+                    'DELETE FROM figures WHERE key IN ('
+                    ' SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used, key) - size AS before FROM figures)'
+                    ' WHERE before < ?)',
+                    (excess,)
+                )
+
+
+# 図表・テーブルの生成結果をLRUで保持するキャッシュ
+# 保持するのはJSONの文字列で、取り出すたびにdict/listに戻す
+# （dict/listのまま持つとJSONの3〜7倍のメモリを使い、上限が効かなくなるため）
+class FigureCache:
+    def __init__(self, max_bytes, shared=None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key, text):
+        size = sys.getsizeof(text)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (text, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    # キャッシュにあればそれを返し、なければbuild()で作って保存する
+    # 返り値はJSONに変換済みのdict/list（呼び出しごとに新しく作る）
+    def get_or_build(self, name, args, version, build):
+        key = make_key(name, args, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            return json.loads(entry[0])
+
+        if self.shared is not None:
+            try:
+                text = self.shared.get(key)
+            except sqlite3.Error as e:
+                print(f"共有キャッシュの読み込みに失敗しました: {e}")
+                text = None
+            if text is not None:
+                self._remember(key, text)
+                with self._lock:
+                    self.shared_hits += 1
+                return json.loads(text)
+
+        with self._lock:
+            self.misses += 1
+        text = json.dumps(build(), cls=PlotlyJSONEncoder)
+        self._remember(key, text)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, text)
+            except sqlite3.Error as e:
+                print(f"共有キャッシュの書き込みに失敗しました: {e}")
+        return json.loads(text)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+cache = FigureCache(
+    int(MEMORY_LIMIT_MB * 1024 * 1024),
+    SQLiteBackend(SHARED_PATH, int(SHARED_LIMIT_MB * 1024 * 1024)) if SHARED_PATH else None
+)
+
+
+def get_or_build(name, args, version, build):
+    return cache.get_or_build(name, args, version, build)
+
+def stats():
+    return cache.stats()
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import schema
+import drive_client
+import data_store
+
+
+# セッションごと（日ごと）に書き出したCSVを置いたフォルダから読み込む
+# 取り込み済みのファイルはマニフェスト（ID・更新日時）に記録し、新しいファイルと更新されたファイルだけを取りに行く
+# 取り込んだファイルは1つずつ解析済みの形でローカルに保存しておき、起動時はそこから組み立てる
+
+# フォルダの保存先（import_data.CACHE_DIRと同じ場所の下に作る）
+CACHE_DIR = os.getenv('DATA_CACHE_DIR', '.data_cache')
+MANIFEST_FILE = 'manifest.json'
+CSV_SUFFIXES = ('.csv', '.csv.gz')
+
+DRIVE_FIELDS = ['id', 'name', 'modifiedTime']
+
+
+# Driveのフォルダ
+class DriveFolder:
+    def __init__(self, folder_id, service=None):
+        self.key = folder_id
+        self.folder_id = folder_id
+        self._service = service
+
+    def service(self):
+        return self._service or drive_client.service()
+
+    # ファイルID → (ファイル名, 更新日時（エポックミリ秒）)
+    def list(self):
+        return {
+            f['id']: (f['name'], int(pd.Timestamp(f['modifiedTime']).value // 10**6))
+            for f in drive_client.list_folder(self.service(), self.folder_id, DRIVE_FIELDS)
+            if f['name'].lower().endswith(CSV_SUFFIXES)
+        }
+
+    def read(self, file_id):
+        with drive_client.open_stream(self.service(), file_id) as stream:
+            return schema.read_csv(stream)
+
+
+# Driveのフォルダの代わりに使うローカルのディレクトリ（開発・動作確認用）。ファイル名をIDとして使う
+class LocalFolder:
+    def __init__(self, path):
+        self.path = path
+        self.key = 'local-' + hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+
+    def list(self):
+        files = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(CSV_SUFFIXES):
+                    files[entry.name] = (entry.name, entry.stat().st_mtime_ns // 10**6)
+        return files
+
+    def read(self, file_id):
+        # .gzはpandasが拡張子から判断して展開する
+        return schema.read_csv(os.path.join(self.path, file_id))
+
+
+# ---- マニフェストとファイルごとのスナップショット ----
+
+def folder_dir(folder, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, 'folder-' + folder.key)
+
+def file_snapshot_path(directory, file_id):
+    return os.path.join(directory, 'files', hashlib.sha1(file_id.encode('utf-8')).hexdigest() + '.pkl')
+
+# マニフェストは {'version': バージョン, 'files': {ファイルID: {'name', 'modified', 'rows'}}}
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'version': None, 'files': {}}
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+def save_file_snapshot(directory, file_id, df):
+    path = file_snapshot_path(directory, file_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def load_file_snapshot(directory, file_id):
+    return schema.apply(pd.read_pickle(file_snapshot_path(directory, file_id)))
+
+
+# フォルダの中身とマニフェストの差分（新規・更新・削除されたファイルID）
+def diff(listing, manifest_files):
+    added = [i for i in listing if i not in manifest_files]
+    changed = [i for i in listing if i in manifest_files and manifest_files[i]['modified'] != listing[i][1]]
+    removed = [i for i in manifest_files if i not in listing]
+    return added, changed, removed
+
+
+# フォルダのバージョンは一番新しいファイルの更新日時
+# ファイルが消えた・古い日時のファイルが増えたなど、更新日時が増えない変更では前のバージョンより1つ進める
+def folder_version(listing, previous_version):
+    version = max((modified for _, modified in listing.values()), default=0)
+    if previous_version is not None and version <= previous_version:
+        version = previous_version + 1
+    return version
+
+
+# フォルダの変更を取り込み、データとバージョンを返す。known_versionから変更がなければNoneを返す
+# incremental=Trueで、known_versionのデータに新しいファイルを足すだけで済む場合は追加分（Increment）を返す
+def load_folder(folder, known_version=None, cache_dir=None, incremental=True):
+    directory = folder_dir(folder, cache_dir)
+    manifest = load_manifest(directory)
+    previous_version = manifest['version']
+
+    # フォルダに接続できなければ、取り込み済みのファイルだけで起動する
+    try:
+        listing = folder.list()
+    except Exception as e:
+        if not manifest['files']:
+            raise
+        print(f"フォルダに接続できないため、取り込み済みのファイルを使用します: {e}")
+        listing = {file_id: (entry['name'], entry['modified']) for file_id, entry in manifest['files'].items()}
+
+    added, changed, removed = diff(listing, manifest['files'])
+    new_frames = {}
+    for file_id in added + changed:
+        name, modified = listing[file_id]
+        df = folder.read(file_id)
+        save_file_snapshot(directory, file_id, df)
+        manifest['files'][file_id] = {'name': name, 'modified': modified, 'rows': len(df)}
+        new_frames[file_id] = df
+        print(f"取り込みました: {name} ({len(df)}行)")
+    for file_id in removed:
+        manifest['files'].pop(file_id)
+        try:
+            os.remove(file_snapshot_path(directory, file_id))
+        except OSError:
+            pass
+        print(f"フォルダから消えたファイルを除きました: {file_id}")
+
+    if added or changed or removed or previous_version is None:
+        manifest['version'] = folder_version(listing, previous_version)
+        try:
+            save_manifest(directory, manifest)
+        except OSError as e:
+            print(f"マニフェストの保存に失敗しました: {e}")
+    if not manifest['files']:
+        raise RuntimeError("フォルダに取り込めるCSVがありません")
+    version = manifest['version']
+    if version == known_version:
+        return None
+
+    # 手元のデータが前回の状態そのままで、新しいファイルが増えただけなら、その行だけを渡す
+    if incremental and known_version is not None and known_version == previous_version and not changed and not removed:
+        return data_store.Increment(schema.concat(list(new_frames.values()), consume=True), version, known_version)
+
+    # それ以外はファイルごとのスナップショットから組み立て直す（取り込み済みのファイルは取りに行かない）
+    frames = [new_frames.get(file_id) if file_id in new_frames else load_file_snapshot(directory, file_id)
+              for file_id in sorted(manifest['files'], key=lambda i: (manifest['files'][i]['modified'], i))]
+    return schema.concat(frames, consume=True), version
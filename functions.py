@@ -1,17 +1,51 @@
-import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+import os
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from PIL import Image
-import io
-import base64
-import requests
-from dash import dash_table 
-import datetime
 import plotly.graph_objects as go
-import numpy as np
-from scipy.stats import chi2
+import pitch_profile
+import summary_cube
+
+
+# 図表を作る関数は受け取ったデータを書き換えない（絞り込み結果はスレッド間・図表間で共有している）
+# 一部の行・列が必要なときは、位置で取り出す（take）
+
+# 投球数がこれを超えたら大量データ用の描画（WebGL・間引き・集計済みバイオリン）に切り替える
+LARGE_N_THRESHOLD = int(os.getenv('LARGE_N_THRESHOLD', '5000'))
+# 大量データ時に散布図に描く点の上限
+LARGE_N_MAX_POINTS = int(os.getenv('LARGE_N_MAX_POINTS', '3000'))
+# 間引き後も各球種に最低限残す点の数
+MIN_POINTS_PER_TYPE = 30
+
+
+def is_large(data):
+    return len(data) > LARGE_N_THRESHOLD
+
+# 球種ごとに層別して点を間引く（球種内では一様に抜くので分布の濃淡は保たれる）
+# 同じデータからは常に同じ点が選ばれる。columnsを渡すと、間引いた行のその列だけを取り出す
+def downsample(data, max_points=None, columns=None):
+    max_points = max_points or LARGE_N_MAX_POINTS
+    if len(data) <= max_points:
+        return data
+    codes, _ = pd.factorize(data['球種'])
+    counts = np.bincount(codes + 1)[1:]
+    quota = np.maximum(np.ceil(counts * max_points / len(data)), np.minimum(counts, MIN_POINTS_PER_TYPE))
+
+    # 球種ごとに乱数順に並べ、各球種の先頭quota件を残す
+    keys = np.random.default_rng(0).random(len(data))
+    order = np.lexsort((keys, codes))
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, sorted_codes, side='left')
+    rank = np.arange(len(order)) - starts
+    valid = sorted_codes >= 0
+    keep = order[valid & (rank < quota[np.where(valid, sorted_codes, 0)])]
+    return take(data, np.sort(keep), columns)
+
+# 位置rowsの行（columnsを渡せばその列だけ）を取り出す。真偽値のマスクで全列を複製するより確保が少ない
+def take(data, rows, columns=None):
+    if columns is None:
+        return data.iloc[rows]
+    return data.iloc[rows, data.columns.get_indexer(columns)]
 
 
 # 球種のパレットの作成
@@ -28,23 +62,30 @@ def set_palette():
 
 
 # 変化量の散布図
-def mov_plot(data, sp_or_trj, color_map):
+def mov_plot(data, sp_or_trj, color_map, mean_points=None, ellipses=None):
     x_col = f'HB ({sp_or_trj})'
     y_col = f'VB ({sp_or_trj})'
 
-    # 元の散布図（透明度0.5）
+    # 元の散布図（透明度0.5）。大量データ時は間引いてWebGLで描く
+    large = is_large(data)
     scatter_fig = px.scatter(
-        data, x=x_col, y=y_col,
+        downsample(data, columns=[x_col, y_col, '球種', '日付']) if large else data, x=x_col, y=y_col,
         color='球種',
         color_discrete_map=color_map,
         hover_data=[x_col, y_col, '日付'],
         title=f'{sp_or_trj} based',
         labels={x_col: '', y_col: ''},
-        opacity=0.7
+        opacity=0.7,
+        render_mode='webgl' if large else 'auto'
     )
 
     # 球種ごとの平均値をプロット（サイズ2倍、透明度1）
-    mean_points = data.groupby('球種')[[x_col, y_col]].mean().reset_index()
+    # 集計済みの平均（球種, x_col, y_col）が渡されればそれを使う。無ければ平均と楕円を同じ球種ごとの集計から出す
+    totals = None
+    if mean_points is None or ellipses is None:
+        totals = summary_cube.aggregate(data, by=['球種'], metrics=[x_col, y_col])
+    if mean_points is None:
+        mean_points = summary_cube.pitch_type_means(totals, [x_col, y_col])
     for _, row in mean_points.iterrows():
         scatter_fig.add_trace(go.Scatter(
             x=[row[x_col]],
@@ -60,6 +101,34 @@ def mov_plot(data, sp_or_trj, color_map):
             showlegend=False  # 凡例は1つにしたければFalse
         ))
 
+    # 球種ごとの分布の楕円（投球のELLIPSE_PROBABILITYが入る範囲）。凡例で球種を消すと楕円も消える
+    # 集計済みの楕円（pitch_profile.ellipses）が渡されればそれを使う
+    if ellipses is None:
+        ellipses = pitch_profile.ellipses(totals, sp_or_trj)
+    for _, row in ellipses.iterrows():
+        x, y = pitch_profile.ellipse_path(row['center_x'], row['center_y'], row['major'], row['minor'], row['angle'])
+        scatter_fig.add_trace(go.Scatter(
+            x=x, y=y,
+            mode='lines',
+            line=dict(color=color_map.get(row['球種'], 'gray'), width=1.5),
+            name=f"{row['球種']} 分布",
+            legendgroup=row['球種'],
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+    # 自分の球種の分布から大きく外れた投球（取り込み時に計算した距離で判定する）
+    outliers = take(data, np.flatnonzero(pitch_profile.outliers(data, sp_or_trj)), [x_col, y_col, '球種', '日付'])
+    if len(outliers):
+        scatter_fig.add_trace((go.Scattergl if large else go.Scatter)(
+            x=outliers[x_col], y=outliers[y_col],
+            mode='markers',
+            marker=dict(symbol='circle-open', size=12, color='black', line=dict(width=1.5)),
+            name='外れ値',
+            customdata=np.stack([outliers['球種'].astype(str), outliers['日付'].dt.strftime('%Y-%m-%d')], axis=-1),
+            hovertemplate='外れ値<br>球種=%{customdata[0]}<br>日付=%{customdata[1]}<extra></extra>'
+        ))
+
     # x=0の縦線
     scatter_fig.add_shape(
         type="line",
@@ -93,16 +162,55 @@ def mov_plot(data, sp_or_trj, color_map):
 
 
 
+# ゾーンプロットの描画範囲と密度グリッドの解像度（1マス2.5cm）
+ZONE_X_RANGE = (-80, 80)
+ZONE_Y_RANGE = (0, 170)
+ZONE_GRID_SHAPE = (64, 68)
+# 密度の平滑化に使うガウスカーネルの幅（マス数）
+ZONE_SMOOTHING = 2.0
+
+
+# 投球位置の密度を固定解像度のグリッドで計算する（点数によらず同じ大きさになる）
+def zone_density_grid(x, y):
+    mask = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(
+        x[mask], y[mask], bins=ZONE_GRID_SHAPE, range=[ZONE_X_RANGE, ZONE_Y_RANGE]
+    )
+    # 縦横それぞれにガウスカーネルを畳み込んで平滑化する
+    half = int(np.ceil(3 * ZONE_SMOOTHING))
+    offsets = np.arange(-half, half + 1)
+    kernel = np.exp(-0.5 * (offsets / ZONE_SMOOTHING) ** 2)
+    kernel /= kernel.sum()
+    smoothed = np.apply_along_axis(np.convolve, 0, counts, kernel, mode='same')
+    smoothed = np.apply_along_axis(np.convolve, 1, smoothed, kernel, mode='same')
+
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    # Contourのzは[行=y][列=x]
+    return x_centers, y_centers, np.round(smoothed.T, 3)
+
+
 # ゾーンプロット
-def zone_plot(df, plot_type):
+# rowsを渡すとdfのその位置の投球だけを描く（球種で絞り込んだ位置。dfを絞り込んだ複製は作らない）
+def zone_plot(df, plot_type, rows=None):
     if plot_type == 'density':
-        fig = go.Figure(go.Histogram2dContour(
-                x = df['Strike Zone Side'],
-                y = df['Strike Zone Height'],
+        x = df['Strike Zone Side'].to_numpy(dtype='float64')
+        y = df['Strike Zone Height'].to_numpy(dtype='float64')
+        if rows is not None:
+            x, y = x[rows], y[rows]
+        x_centers, y_centers, z = zone_density_grid(x, y)
+        fig = go.Figure(go.Contour(
+                x = x_centers,
+                y = y_centers,
+                z = z,
                 colorscale = 'Reds',
+                hoverinfo = 'skip',
         ))
     elif plot_type == 'point':
-        fig = px.scatter(df, x='Strike Zone Side', y='Strike Zone Height')
+        points = df if rows is None else take(df, rows, ['Strike Zone Side', 'Strike Zone Height', '球種'])
+        large = is_large(points)
+        fig = px.scatter(downsample(points) if large else points, x='Strike Zone Side', y='Strike Zone Height',
+                         render_mode='webgl' if large else 'auto')
         
     fig.add_shape(
             type="line",
@@ -137,7 +245,10 @@ def zone_plot(df, plot_type):
     return fig
 
 # バイオリンプロット
-def violin_plot(data, label, color_map):
+# rowsは球種ごとの行の位置（Dataset.pitch_type_rowsの結果）。大量データ用の描画で使う
+def violin_plot(data, label, color_map, rows=None):
+    if is_large(data):
+        return violin_plot_summary(data, label, color_map, rows)
     violin_fig = px.violin(
         data, x='球種', y=label,
         box=True, points="all",
@@ -159,16 +270,103 @@ def violin_plot(data, label, color_map):
     return violin_fig
 
 
+# ガウスカーネルの密度推定（ヒストグラムに集約してから平滑化するので点数によらず軽い）
+def binned_kde(values, grid_size=256):
+    lo, hi = values.min(), values.max()
+    std = values.std()
+    bandwidth = 1.06 * std * len(values) ** (-1 / 5) if std > 0 else 1.0
+    lo, hi = lo - 3 * bandwidth, hi + 3 * bandwidth
+    counts, edges = np.histogram(values, bins=grid_size, range=(lo, hi))
+    centers = (edges[:-1] + edges[1:]) / 2
+    step = centers[1] - centers[0]
+    half = min(int(np.ceil(4 * bandwidth / step)), grid_size // 2 - 1)
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    density = np.convolve(counts, kernel, mode='same')
+    return centers, density / density.max()
+
+# 大量データ用のバイオリンプロット。密度と箱ひげの統計量をサーバー側で計算し、生の点は送らない
+# 球種ごとの値は、列の配列から球種ごとの位置で取り出す（球種ごとに絞り込んだコピーを作らない）
+def violin_plot_summary(data, label, color_map, rows=None):
+    fig = go.Figure()
+    pitch_types = [pt for pt in pd.unique(data['球種']) if pd.notna(pt)]
+    if rows is None:
+        rows = data['球種'].groupby(data['球種'], observed=True, sort=False).indices
+    column = data[label].to_numpy()
+    for i, pitch_type in enumerate(pitch_types):
+        values = column[rows[pitch_type]].astype('float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            continue
+        color = color_map.get(pitch_type, '#CCCCCC')
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        iqr = q3 - q1
+        lowerfence = values[values >= q1 - 1.5 * iqr].min()
+        upperfence = values[values <= q3 + 1.5 * iqr].max()
+
+        if len(values) > 1 and values.std() > 0:
+            grid, density = binned_kde(values)
+            fig.add_trace(go.Scatter(
+                x=np.concatenate([i - 0.4 * density, (i + 0.4 * density)[::-1]]),
+                y=np.concatenate([grid, grid[::-1]]),
+                mode='lines', fill='toself',
+                line=dict(color=color, width=1),
+                name=pitch_type, legendgroup=pitch_type,
+                hoverinfo='skip'
+            ))
+        fig.add_trace(go.Box(
+            x=[i], q1=[q1], median=[median], q3=[q3],
+            lowerfence=[lowerfence], upperfence=[upperfence],
+            width=0.1, marker_color=color,
+            name=pitch_type, legendgroup=pitch_type, showlegend=False
+        ))
+
+    fig.update_layout(
+        title=label,
+        xaxis=dict(tickvals=list(range(len(pitch_types))), ticktext=pitch_types, title='球種'),
+        yaxis=dict(title=label),
+        legend=dict(
+            orientation="h",
+            y=-0.2,
+            x=0,
+            xanchor='left',
+            yanchor='top'
+        ),
+        title_x=0.5,
+        margin=dict(l=0,r=0)
+    )
+    return fig
+
+
+
+
+# 推移グラフの平滑化の線（'ewm': 指数移動平均, 'rolling': 移動平均, 'none': 描かない）
+TREND_SMOOTHING = os.getenv('TREND_SMOOTHING', 'ewm')
+RESOLUTION_LABELS = {'day': '日ごと', 'week': '週ごと', 'month': '月ごと'}
 
 
 # 推移グラフ
-def line_plot(df, y_label, color_map):
-    df['date'] = pd.to_datetime(df['日付'])
-    summary = df.groupby(['date', '球種'])[y_label].mean().reset_index()
+def line_plot(df, y_label, color_map, summary=None, resolution='day'):
+    # 集計済みの系列（summary_cube.trend_series）と解像度が渡されればそれを使う
+    # 無ければdfから作る（解像度は日付の範囲から選ぶ）
+    if summary is None:
+        summary, resolution = summary_cube.trend_from_frame(df, y_label)
 
     fig = px.line(summary, x='date', y=y_label, color='球種',
                 color_discrete_map=color_map,
-                title=y_label)
+                markers=resolution != 'day',
+                title=f'{y_label}（{RESOLUTION_LABELS[resolution]}）')
+    if TREND_SMOOTHING in summary.columns:
+        for pitch_type, series in summary.groupby('球種', observed=True, sort=False):
+            fig.add_trace(go.Scatter(
+                x=series['date'], y=series[TREND_SMOOTHING],
+                mode='lines',
+                line=dict(color=color_map.get(pitch_type, '#CCCCCC'), width=3, dash='dot'),
+                name=f'{pitch_type} 平滑',
+                legendgroup=pitch_type,
+                showlegend=False,
+                hoverinfo='skip'
+            ))
     fig.update_layout(
         legend=dict(
             orientation="h",
@@ -186,13 +384,15 @@ def line_plot(df, y_label, color_map):
 
 # リリース位置の散布図
 def release_plot(df, x_axis, y_axis, color_map, x_s, x_e):
+    large = is_large(df)
     fig = px.scatter(
-        data_frame=df,
+        data_frame=downsample(df, columns=[x_axis, y_axis, '球種']) if large else df,
         x=x_axis,
         y=y_axis,
         color='球種',
         color_discrete_map=color_map,
-        title='Release Position'
+        title='Release Position',
+        render_mode='webgl' if large else 'auto'
     )
     fig.update_yaxes(range=(0.5, 2.1))
     fig.update_xaxes(range=(x_s, x_e))
@@ -212,9 +412,11 @@ def release_plot(df, x_axis, y_axis, color_map, x_s, x_e):
 
 
 # リリース角度(鉛直方向)の描写
-def release_angle(df, color_map):
-    mean_angles = df.groupby('球種')['Release Angle'].mean().reset_index()
-    mean_angles['Release Angle_rad'] = np.deg2rad(mean_angles['Release Angle'])
+def release_angle(df, color_map, mean_angles=None):
+    # 球種ごとの平均（球種, Release Angle）が渡されればそれを使う
+    if mean_angles is None:
+        mean_angles = summary_cube.pitch_type_means(
+            summary_cube.aggregate(df, by=['球種'], metrics=['Release Angle'], pairs=False), ['Release Angle'])
 
     theta = np.linspace(-np.pi/4, np.pi/4, 360)
     x_circle = np.cos(theta)
@@ -233,7 +435,7 @@ def release_angle(df, color_map):
     # 各球種の平均Release Angleをプロット
     for index, row in mean_angles.iterrows():
         pitch_type = row['球種']
-        angle_rad = row['Release Angle_rad']
+        angle_rad = np.deg2rad(row['Release Angle'])
         
         # 線の描画
         fig.add_trace(go.Scatter(
@@ -270,40 +472,14 @@ def release_angle(df, color_map):
 
 
 
-# 平均値テーブルの作成
+# 平均値テーブルの作成（列の定義はsummary_cube.MEAN_TABLE / MEAN_TABLE2。球種ごとの集計は1回で済ませる）
 def mean_table(df):
-    投球数 = df['Velocity'].groupby(df['球種']).size()
-    平均球速 = df['Velocity'].groupby(df['球種']).mean().round(1)
-    最速 = df['Velocity'].groupby(df['球種']).max().round(1)
-    回転数 = df['Total Spin'].groupby(df['球種']).mean().round(1)
-    回転効率 = df['Spin Efficiency (release)'].groupby(df['球種']).mean().round(1)
-    VB_Spin = df['VB (spin)'].groupby(df['球種']).mean().round(1)
-    HB_Spin = df['HB (spin)'].groupby(df['球種']).mean().round(1)
-    VB_Trj = df['VB (trajectory)'].groupby(df['球種']).mean().round(1)
-    HB_Trj = df['HB (trajectory)'].groupby(df['球種']).mean().round(1)
-
-    rap_list = [投球数, 平均球速, 最速, 回転数, 回転効率, VB_Spin, HB_Spin, VB_Trj, HB_Trj]
-    labels = ['N', 'Velo(Mean)', 'Velo(Max)', 'Total_Spin', 'Spin_Eff', 'VB(Spin)', 'HB(Spin)', 'VB(Traj)', 'HB(Traj)']
-    output = pd.DataFrame({label: stat for label, stat in zip(labels, rap_list)})
-    output = output.reset_index()
-    output = output.sort_values(by='N', ascending=False)
-    return output
+    totals = summary_cube.aggregate(df, by=['球種'], metrics=summary_cube.spec_metrics(summary_cube.MEAN_TABLE), pairs=False)
+    return summary_cube.build_table(totals, summary_cube.MEAN_TABLE)
 
 def mean_table2(df):
-    N = df['Velocity'].groupby(df['球種']).size()
-    RelX = df['Release Side'].groupby(df['球種']).mean().round(2)
-    RelZ = df['Release Height'].groupby(df['球種']).max().round(2)
-    RelAng = df['Release Angle'].groupby(df['球種']).mean().round(2)
-    RelEx = df['Release Extension (ft)'].groupby(df['球種']).mean().round(2)
-    VAA = round(0.348*df['Vertical Approach Angle'].groupby(df['球種']).mean(), 1)
-    ストライク率 = round(100* df[df['Is Strike']=='Y'].groupby(df['球種']).size() / N, 1)
-
-    rap_list = [N, RelZ, RelX, RelAng, RelEx, VAA, ストライク率]
-    labels = ['N', 'Release Height[m]', 'Release Side[m]', 'Release Angle[°]', 'Extension[m]', 'VAA[°]', 'Zone%']
-    output = pd.DataFrame({label: stat for label, stat in zip(labels, rap_list)})
-    output = output.reset_index()
-    output = output.sort_values(by='N', ascending=False)
-    return output
+    totals = summary_cube.aggregate(df, by=['球種'], metrics=summary_cube.spec_metrics(summary_cube.MEAN_TABLE2), pairs=False)
+    return summary_cube.build_table(totals, summary_cube.MEAN_TABLE2)
 
 
 
@@ -1,36 +1,135 @@
 import os
-import io
 import json
 import pandas as pd
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from dotenv import load_dotenv 
+import schema
+import drive_client
+import folder_ingest
+from dotenv import load_dotenv
 
 
-def authenticate_google_drive():
-    SERVICE_ACCOUNT_JSON = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
-    SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-    # JSON文字列を辞書に変換
-    service_account_info = json.loads(SERVICE_ACCOUNT_JSON)
-    creds = service_account.Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
-    return creds
+# ローカルスナップショットの保存先
+CACHE_DIR = os.getenv('DATA_CACHE_DIR', '.data_cache')
 
-def read_uploaded_csv_from_drive(file_id):
-    creds = authenticate_google_drive()
-    service = build('drive', 'v3', credentials=creds)
+# 変更検知に使うDriveファイルのメタデータ
+SNAPSHOT_FIELDS = ['modifiedTime', 'md5Checksum']
 
+
+# スナップショットのパス（データ本体, メタデータ）
+def snapshot_paths(file_id, cache_dir=None):
+    base = os.path.join(cache_dir or CACHE_DIR, file_id)
+    return base + '.pkl', base + '.json'
+
+def load_snapshot(file_id, cache_dir=None):
+    data_path, meta_path = snapshot_paths(file_id, cache_dir)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        df = pd.read_pickle(data_path)
+    except Exception:
+        return None, None
+    return df, meta
+
+def save_snapshot(file_id, df, meta, cache_dir=None):
+    data_path, meta_path = snapshot_paths(file_id, cache_dir)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    # 書き込み途中のファイルを他のワーカーが読まないよう、一時ファイル経由で置き換える
+    df.to_pickle(data_path + '.tmp')
+    os.replace(data_path + '.tmp', data_path)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + '.tmp', meta_path)
+
+def is_snapshot_fresh(snapshot_meta, drive_meta):
+    if not snapshot_meta:
+        return False
+    return all(snapshot_meta.get(k) == drive_meta.get(k) for k in SNAPSHOT_FIELDS)
+
+
+def fetch_file_metadata(service, file_id):
+    return drive_client.get_metadata(service, file_id, SNAPSHOT_FIELDS)
+
+# ダウンロードしながら読み込む。生データ全体をメモリに溜めず、gzip圧縮にも対応する
+def download_csv(service, file_id):
+    with drive_client.open_stream(service, file_id) as stream:
+        return schema.read_csv(stream)
+
+
+# Driveの更新日時（エポックミリ秒）をデータバージョンとして使う
+def data_version(meta):
+    return int(pd.Timestamp(meta['modifiedTime']).value // 10**6)
+
+
+# データとバージョンを返す。known_versionから変更がなければNoneを返す
+def load_dataset(file_id, known_version=None, service=None, cache_dir=None):
+    _, meta_path = snapshot_paths(file_id, cache_dir)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            snapshot_meta = json.load(f)
+    except (OSError, ValueError):
+        snapshot_meta = None
+
+    # Driveのメタデータを確認し、Driveに接続できなければスナップショットで起動する
+    offline = False
+    try:
+        if service is None:
+            service = drive_client.service()
+        drive_meta = fetch_file_metadata(service, file_id)
+    except Exception as e:
+        if snapshot_meta is None:
+            raise
+        print(f"Driveに接続できないため、ローカルのスナップショットを使用します: {e}")
+        drive_meta = snapshot_meta
+        offline = True
+
+    version = data_version(drive_meta)
+    if version == known_version:
+        return None
+
+    if is_snapshot_fresh(snapshot_meta, drive_meta):
+        df, _ = load_snapshot(file_id, cache_dir)
+        if df is not None:
+            return df, version
+        if offline:
+            raise RuntimeError("ローカルのスナップショットを読み込めません")
+
+    df = download_csv(service, file_id)
+    try:
+        save_snapshot(file_id, df, {k: drive_meta.get(k) for k in SNAPSHOT_FIELDS}, cache_dir)
+    except OSError as e:
+        print(f"スナップショットの保存に失敗しました: {e}")
+    return df, version
+
+
+# ローカルのCSVを読み込む（開発・ベンチマーク用）。バージョンはファイルの更新日時
+def load_local_csv(path, known_version=None):
+    version = os.stat(path).st_mtime_ns // 10**6
+    if version == known_version:
+        return None
+    return schema.read_csv(path), version
+
+
+# 環境変数で指定された元データのローダー（load(known_version)）
+# LOCAL_CSV_PATHがあればローカルのCSV、LOCAL_FOLDER_PATH・GOOGLE_DRIVE_FOLDER_IDがあればセッションごとのCSVを置いたフォルダ、
+# どれもなければGOOGLE_DRIVE_FILE_IDのDriveファイル
+# フォルダの場合、incremental=Trueなら新しいファイルの分だけを追加分として返す
+def source_loader(incremental=True):
+    local_csv_path = os.getenv('LOCAL_CSV_PATH')
+    if local_csv_path:
+        return lambda known_version: load_local_csv(local_csv_path, known_version)
+    local_folder_path = os.getenv('LOCAL_FOLDER_PATH')
+    folder_id = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
+    if local_folder_path or folder_id:
+        folder = folder_ingest.LocalFolder(local_folder_path) if local_folder_path else folder_ingest.DriveFolder(folder_id)
+        return lambda known_version: folder_ingest.load_folder(folder, known_version, incremental=incremental)
+    file_id = os.getenv('GOOGLE_DRIVE_FILE_ID')
+    return lambda known_version: load_dataset(file_id, known_version)
+
+
+def read_uploaded_csv_from_drive(file_id, service=None, cache_dir=None):
     try:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        fh.seek(0)
-        df = pd.read_csv(fh)
+        df, _ = load_dataset(file_id, service=service, cache_dir=cache_dir)
         return df
 
     except Exception as e:
         print(f"読み込み中にエラーが発生しました: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -1,33 +1,51 @@
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, ClientsideFunction
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from PIL import Image
-import io
-import base64
 from dash import dash_table  
 import functions
 import import_data
+import data_store
+import shared_data
+import portraits
+import figure_cache
+import metrics
+import summary_cube
+import pitch_profile
+import client_data
+import payload
 import os
+import threading
 from dotenv import load_dotenv  # ← 追加
 import os
 from dash import Dash, html
-from flask import request, Response
+from flask import request, Response, abort
+from dash.exceptions import PreventUpdate, MissingCallbackContextException
 from dotenv import load_dotenv
 
 # データの読み込み
 SERVICE_ACCOUNT_JSON = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
 FILE_ID = os.getenv('GOOGLE_DRIVE_FILE_ID')
-
-try:
-    df = import_data.read_uploaded_csv_from_drive(FILE_ID)
-    #df = pd.read_csv('csv_files/rapsodo_kunimoto.csv')
-    df['日付'] = pd.to_datetime(df['日付'])
-    df['Release Extension (m)'] = 0.3048*df['Release Extension (ft)']
-except FileNotFoundError:
-    print("エラー: 'csv_files/rapsodo_kunimoto.csv' が見つかりません。")
-    exit()
+# Driveの代わりにローカルのCSVを読む場合は LOCAL_CSV_PATH（例: csv_files/rapsodo_kunimoto.csv）を指定する
+# セッションごとのCSVを置いたフォルダから読む場合は GOOGLE_DRIVE_FOLDER_ID（ローカルなら LOCAL_FOLDER_PATH）を指定する
+# データの再読み込み間隔（秒）。0なら起動時に一度だけ読み込む
+RELOAD_INTERVAL = int(os.getenv('DATA_RELOAD_INTERVAL', '0'))
+# 読み込み中の画面がデータの準備を確認する間隔（ミリ秒）
+LOADING_POLL_MS = int(os.getenv('LOADING_POLL_MS', '1000'))
+# 1なら、選手を選んだときにその選手のデータをブラウザに送り、日付範囲・Y軸・ゾーンの球種の変更は
+# ブラウザ内（assets/client_filter.js）で図表を作り直す。サーバーへのリクエストは選手の選択ごとに1回になる
+CLIENT_FILTERING = os.getenv('CLIENT_FILTERING', '0') == '1'
+
+# 共有データを使う場合は追加分ではなく全体を受け取り、共有データとして作り直す
+load = import_data.source_loader(incremental=not shared_data.SHARED_DATA_DIR)
+# SHARED_DATA_DIRがあれば、データは一度だけ作り、各ワーカーはそれをメモリマップして使う
+if shared_data.SHARED_DATA_DIR:
+    load = data_store.shared_loader(shared_data.SHARED_DATA_DIR, load, RELOAD_INTERVAL)
+store = data_store.DataStore(load, RELOAD_INTERVAL)
+# データはバックグラウンドで読み込み、サーバーはすぐに起動する（揃うまでは読み込み中の画面を出す）
+store.start()
 
 # Dashアプリケーションの初期化
 
@@ -61,38 +79,45 @@ server = app.server
 server.before_request(requires_auth(lambda: None))
 
 
-# 背景を透過して画像を正方形に切り抜きBase64で返す関数
-def process_image_to_square_base64_with_transparency(image_bytes):
-    try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-
-        # 背景色を左上ピクセルと仮定して透過処理
-        bg_color = (244, 247, 246)
-        datas = img.getdata()
-        newData = []
-        for item in datas:
-            if all(abs(item[i] - bg_color[i]) < 10 for i in range(3)):
-                newData.append((255, 255, 255, 0))  # 背景透過
-            else:
-                newData.append(item)
-        img.putdata(newData)
-
-        # 正方形に中央トリミング
-        width, height = img.size
-        new_size = min(width, height)
-        left = (width - new_size) / 2
-        top = (height - new_size) / 2
-        right = (width + new_size) / 2
-        bottom = (height + new_size) / 2
-        img_cropped = img.crop((left, top, right, bottom))
-
-        buffered = io.BytesIO()
-        img_cropped.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        return f"data:image/png;base64,{img_str}"
-    except Exception as e:
-        print(f"画像処理エラー（透過）: {e}")
-        return None
+# 図表キャッシュとデータの状態も/metricsに出す
+def extra_metrics():
+    cache_stats = figure_cache.stats()
+    return {
+        'dash_data_version': store.version or 0,
+        'dash_data_ready': int(store.ready),
+        'dash_figure_cache_hits_total': cache_stats['hits'],
+        'dash_figure_cache_shared_hits_total': cache_stats['shared_hits'],
+        'dash_figure_cache_misses_total': cache_stats['misses'],
+        'dash_figure_cache_evictions_total': cache_stats['evictions'],
+        'dash_figure_cache_bytes': cache_stats['bytes'],
+    }
+
+# コールバックの応答をgzip/brotliで圧縮する（メトリクスのレスポンスサイズは圧縮前の値になる）
+payload.init_app(server)
+# コールバックの処理時間・レスポンスサイズを計測し、/metricsで公開する（認証は上と共通）
+metrics.init_app(server, extra_metrics)
+
+
+# 選手画像（背景透過・正方形に加工済み）を配信する
+@server.route('/player-image/<name>.png')
+def player_image(name):
+    portrait = portraits.get_portrait(name)
+    if portrait is None:
+        abort(404)
+    body, etag = portrait
+    response = Response(body, mimetype='image/png')
+    response.set_etag(etag)
+    # URLにETagを含めているので、内容が変わるとURLも変わる
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+# 起動時に画像を加工しておき、最初の表示を待たせない
+# データの読み込みとCPUを取り合わないよう、データが揃ってから始める
+def warm_portraits():
+    store.wait()
+    portraits.warm()
+
+threading.Thread(target=warm_portraits, name='portrait-warmup', daemon=True).start()
 
 
 # Dashアプリのレイアウト
@@ -119,272 +144,521 @@ app.index_string = '''
 '''
 
 
-app.layout = html.Div(className='dash-container', children=[
-    html.Link(rel='stylesheet', href='style.css'),
-    html.Div(
-        className='header-container',
-        style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'marginTop': '20px', 'marginBottom': '40px'},
-        children=[
-            html.Img(
-                src='/assets/tsukuba_logo.png',  # ← assets フォルダに置いた場合のパス
-                style={'height': '60px', 'marginRight': '20px'}
-            ),
-            html.H1(
-                "Rapsodo DashBoard",
-                style={'color': '#2C3E50', 'margin': 0}
-            ),
-            
-        ]
-    ),
-
-
-    html.Div(className='name-selection-and-image-row', children=[
-        html.Div(className='dash-dropdown-container two-third-width', children=[
-            html.Label("名前を選択:"),
-            dcc.Dropdown(
-                id='name-dropdown',
-                options=[{'label': i, 'value': i} for i in df['名前'].unique()],
-                value=df['名前'].unique()[0],
-                clearable=False
-            ),
-            html.Label("日付範囲を選択:", style={'marginTop': '25px'}),
-            dcc.DatePickerRange(
-                id='date-picker-range',
-                start_date=df['日付'].min(),
-                end_date=df['日付'].max(),
-                display_format='YYYY-MM-DD'
-            ),
+# ダッシュボード本体。datasetがNoneなら中身のない形（コールバックの検証用）
+def dashboard_layout(dataset):
+    names = dataset.names if dataset is not None else []
+    start_date = dataset.df['日付'].min() if dataset is not None else None
+    end_date = dataset.df['日付'].max() if dataset is not None else None
+    return html.Div(children=[
+        html.Div(className='name-selection-and-image-row', children=[
+            html.Div(className='dash-dropdown-container two-third-width', children=[
+                html.Label("名前を選択:"),
+                dcc.Dropdown(
+                    id='name-dropdown',
+                    options=[{'label': i, 'value': i} for i in names],
+                    value=names[0] if len(names) else None,
+                    clearable=False
+                ),
+                # クライアント側で絞り込むモードで使う、選択中の選手のデータ
+                dcc.Store(id='player-data') if CLIENT_FILTERING else None,
+                html.Label("日付範囲を選択:", style={'marginTop': '25px'}),
+                dcc.DatePickerRange(
+                    id='date-picker-range',
+                    start_date=start_date,
+                    end_date=end_date,
+                    display_format='YYYY-MM-DD'
+                ),
+            ]),
+
+            html.Div(className='image-display-container one-third-width', children=[
+                html.Img(id='player-image', style={
+                    'width': '200px', 'height': '200px',
+                    'objectFit': 'cover', 'borderRadius': '0%',
+                    'border': '0px solid #ddd', 'display': 'block',
+                    'margin': '0 auto'
+                })
+            ]),
         ]),
 
-        html.Div(className='image-display-container one-third-width', children=[
-            html.Img(id='player-image', style={
-                'width': '200px', 'height': '200px',
-                'objectFit': 'cover', 'borderRadius': '0%',
-                'border': '0px solid #ddd', 'display': 'block',
-                'margin': '0 auto'
-            })
-        ]),
-    ]),
-
     
-    html.H2("球種別 平均値"),
-        html.Div(className='dash-table-container', children=[
-            dash_table.DataTable(
-                id='summary-table',
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'center'},
-                style_header={'backgroundColor': '#f2f2f2', 'fontWeight': 'bold'}
-            ),
-            dash_table.DataTable(
-                id='summary-table2',
-                style_table={'overflowX': 'auto', 'marginTop': '25px'},
-                style_cell={'textAlign': 'center'},
-                style_header={'backgroundColor': '#f2f2f2', 'fontWeight': 'bold'}
-            ),
-        ]),
+        html.H2("球種別 平均値"),
+            html.Div(className='dash-table-container', children=[
+                dash_table.DataTable(
+                    id='summary-table',
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'center'},
+                    style_header={'backgroundColor': '#f2f2f2', 'fontWeight': 'bold'}
+                ),
+                dash_table.DataTable(
+                    id='summary-table2',
+                    style_table={'overflowX': 'auto', 'marginTop': '25px'},
+                    style_cell={'textAlign': 'center'},
+                    style_header={'backgroundColor': '#f2f2f2', 'fontWeight': 'bold'}
+                ),
+            ]),
         
-    html.Div("", className="page-break"),
+        html.Div("", className="page-break"),
 
 
-    html.H2("変化量 散布図"),
-    html.Div(className='scatter-wrapper', children=[
-        html.Div(dcc.Graph(id='scatter-plot'), className='scatter-plot-box'),
-        html.Div(dcc.Graph(id='scatter-plot2'), className='scatter-plot-box'),
-    ]),
-    html.Div("", className="page-break"),
+        html.H2("変化量 散布図"),
+        html.Div(className='scatter-wrapper', children=[
+            html.Div(dcc.Graph(id='scatter-plot'), className='scatter-plot-box'),
+            html.Div(dcc.Graph(id='scatter-plot2'), className='scatter-plot-box'),
+        ]),
+        html.Div("", className="page-break"),
     
     
-    html.H2("投球位置 散布図"),
-    html.Div(className='dash-dropdown-container2', children=[
-        html.Label("球種を選択:"),
-        dcc.Dropdown(
-            id='zone-pt-dropdown',
-            clearable=False,
-            value='ストレート'
-        )
-    ]),
-    html.Div(className='scatter-wrapper', children=[
-        html.Div(dcc.Graph(id='zone-plot'), className='scatter-plot-box'),
-        html.Div(dcc.Graph(id='zone-plot2'), className='scatter-plot-box'),
-    ]),
-    html.Div("", className="page-break"),
+        html.H2("投球位置 散布図"),
+        html.Div(className='dash-dropdown-container2', children=[
+            html.Label("球種を選択:"),
+            dcc.Dropdown(
+                id='zone-pt-dropdown',
+                clearable=False,
+                value='ストレート'
+            )
+        ]),
+        html.Div(className='scatter-wrapper', children=[
+            html.Div(dcc.Graph(id='zone-plot'), className='scatter-plot-box'),
+            html.Div(dcc.Graph(id='zone-plot2'), className='scatter-plot-box'),
+        ]),
+        html.Div("", className="page-break"),
 
     
     
-    html.H2('リリース位置'),
-    html.Div(className='release-wrapper', children=[
-        html.Div(dcc.Graph(id='release-plot'), className='release-plot-box'),
-        html.Div(dcc.Graph(id='release-angle-plot'), className='release-plot-box'),
-    ]),
-    html.Div("", className="page-break"),
-
-    # Extensionプロット（1つだけ）
-    html.Div(className='release-wrapper', children=[
-        html.Div(dcc.Graph(id='extension-plot'), className='release-plot-box'),
-    ]),
-    html.Div("", className="page-break"),
+        html.H2('リリース位置'),
+        html.Div(className='release-wrapper', children=[
+            html.Div(dcc.Graph(id='release-plot'), className='release-plot-box'),
+            html.Div(dcc.Graph(id='release-angle-plot'), className='release-plot-box'),
+        ]),
+        html.Div("", className="page-break"),
+
+        # Extensionプロット（1つだけ）
+        html.Div(className='release-wrapper', children=[
+            html.Div(dcc.Graph(id='extension-plot'), className='release-plot-box'),
+        ]),
+        html.Div("", className="page-break"),
 
     
-    html.H2("球種別 バイオリンプロット & 推移グラフ"),
-    html.Div(className='dash-dropdown-container2', children=[
-        html.Label("Y軸を選択:"),
-        dcc.Dropdown(
-            id='y-axis-value-dropdown',
-            options=['Velocity', 'Total Spin', 'True Spin (release)', 'Spin Efficiency (release)', 
-                     'VB (trajectory)', 'HB (trajectory)', 'VB (spin)', 'HB (spin)', 'Release Angle', 
-                     'Release Height', 'Release Side', 'Horizontal Approach Angle', 'Vertical Approach Angle',
-                     'Release Extension (m)'],
-            value='Velocity',
-            clearable=False
-        )
-    ]),
-    dcc.Graph(id='violin-plot'),
-    html.Div("", className="page-break"),
-    dcc.Graph(id='line-plot'),
-    html.Div("", className="page-break"),
+        html.H2("球種別 バイオリンプロット & 推移グラフ"),
+        html.Div(className='dash-dropdown-container2', children=[
+            html.Label("Y軸を選択:"),
+            dcc.Dropdown(
+                id='y-axis-value-dropdown',
+                options=['Velocity', 'Total Spin', 'True Spin (release)', 'Spin Efficiency (release)', 
+                         'VB (trajectory)', 'HB (trajectory)', 'VB (spin)', 'HB (spin)', 'Release Angle', 
+                         'Release Height', 'Release Side', 'Horizontal Approach Angle', 'Vertical Approach Angle',
+                         'Release Extension (m)'],
+                value='Velocity',
+                clearable=False
+            )
+        ]),
+        dcc.Graph(id='violin-plot'),
+        html.Div("", className="page-break"),
+        dcc.Graph(id='line-plot'),
+        html.Div("", className="page-break"),
     
      
-    html.H2('動画'),
-    html.Div([
-        html.Label("動画の日付を選択:"),
-        dcc.Dropdown(id='date-dropdown', placeholder='日付を選択'),
-        html.Div(id='youtube-player', style={'marginTop': '20px'}),
-    ]),
-    
-    html.Footer(
-        style={
-            'textAlign': 'center',
-            'padding': '20px',
-            'marginTop': '50px',
-            'borderTop': '1px solid #ddd',
-            'color': '#888',
-            'fontSize': '14px',
-            'backgroundColor': '#f9f9f9',
-        },
-        children="© 2025 Yuta Kanno. University of Tsukuba."
-    )
-])
+        html.H2('動画'),
+        html.Div([
+            html.Label("動画の日付を選択:"),
+            dcc.Dropdown(id='date-dropdown', placeholder='日付を選択'),
+            html.Div(id='youtube-player', style={'marginTop': '20px'}),
+        ])
+    ])
+
+# データの読み込み中に出す画面。準備ができたらshow_dashboardがダッシュボードに差し替える
+def loading_layout():
+    return html.Div(className='loading-container', style={'textAlign': 'center', 'marginTop': '80px'}, children=[
+        html.H2("データを読み込んでいます…"),
+        html.Div(id='loading-message', style={'color': '#888'}),
+        dcc.Interval(id='loading-interval', interval=LOADING_POLL_MS),
+    ])
+
+# ページの枠（ヘッダー・フッター）と中身
+def page_layout(content):
+    return html.Div(className='dash-container', children=[
+        html.Link(rel='stylesheet', href='style.css'),
+        html.Div(
+            className='header-container',
+            style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'marginTop': '20px', 'marginBottom': '40px'},
+            children=[
+                html.Img(
+                    src='/assets/tsukuba_logo.png',  # ← assets フォルダに置いた場合のパス
+                    style={'height': '60px', 'marginRight': '20px'}
+                ),
+                html.H1(
+                    "Rapsodo DashBoard",
+                    style={'color': '#2C3E50', 'margin': 0}
+                ),
+            
+            ]
+        ),
+
+        html.Div(id='page-content', children=content),
+
+        html.Footer(
+            style={
+                'textAlign': 'center',
+                'padding': '20px',
+                'marginTop': '50px',
+                'borderTop': '1px solid #ddd',
+                'color': '#888',
+                'fontSize': '14px',
+                'backgroundColor': '#f9f9f9',
+            },
+            children="© 2025 Yuta Kanno. University of Tsukuba."
+        ),
+    ])
+
+# ページを開くたびに呼ばれる。選手・日付の範囲はその時点のデータから作る
+def serve_layout():
+    dataset = store.dataset
+    return page_layout(dashboard_layout(dataset) if dataset is not None else loading_layout())
+
+
+app.layout = serve_layout
+# 最初のレイアウトに無いコンポーネントのコールバックも検証できるよう、全体の形を渡しておく
+app.validation_layout = html.Div([page_layout(dashboard_layout(None)), loading_layout()])
 
-# コールバック: グラフと画像を更新
+
+# コールバック: 読み込み中の画面（データが揃ったらダッシュボードに差し替える）
 @app.callback(
-    [Output('scatter-plot', 'figure'),
-     Output('scatter-plot2', 'figure'),
-     Output('release-plot', 'figure'),
-     Output('release-angle-plot', 'figure'),
-     Output('extension-plot', 'figure'),
-     Output('violin-plot', 'figure'),
-     Output('line-plot', 'figure'),
-     Output('player-image', 'src'),
-     Output('summary-table', 'data'),
+    [Output('page-content', 'children'),
+     Output('loading-message', 'children')],
+    Input('loading-interval', 'n_intervals')
+)
+def show_dashboard(n_intervals):
+    dataset = store.dataset
+    if dataset is None:
+        message = f"読み込みに失敗しました。再試行しています: {store.error}" if store.error is not None else ""
+        return dash.no_update, message
+    return dashboard_layout(dataset), dash.no_update
+
+# サーバー側のコールバックを登録する
+# クライアント側で絞り込むモードでは、同じ出力をassets/client_filter.jsが担当するので登録しない
+# （関数はそのまま残るので、ベンチマークなどから直接呼べる）
+def server_callback(*args, **kwargs):
+    if CLIENT_FILTERING:
+        return lambda f: f
+    return app.callback(*args, **kwargs)
+
+
+# 球種の色（全コールバックで共通）
+color_map = functions.set_palette()
+
+
+# コールバックで使うデータ。読み込み中（再起動直後に古い画面から呼ばれた場合など）は更新しない
+def current_dataset():
+    dataset = store.dataset
+    if dataset is None:
+        raise PreventUpdate
+    return dataset
+
+# 図表をキャッシュ経由で作る。キーは（選手, 日付範囲, オプション, データバージョン）
+# 絞り込みはキャッシュに無いときだけ行う。図表は送る形に小さくしてから保存する
+def cached(dataset, name, selection, options, build):
+    def timed_build():
+        with metrics.timer('builder', name):
+            return payload.slim(build(dataset.slice(*selection)))
+    return figure_cache.get_or_build(name, selection + options, dataset.version, timed_build)
+
+# 絞り込んだ投球数をメトリクスに記録する（絞り込み結果はDatasetが使い回す）
+def observe_selection(dataset, selection):
+    metrics.observe_rows(len(dataset.slice(*selection)))
+
+# このリクエストで変わった入力がpropsだけか（ページを開いた直後の呼び出しや、直接呼んだ場合はFalse）
+def only_changed(*props):
+    try:
+        changed = set(dash.ctx.triggered_prop_ids)
+    except MissingCallbackContextException:
+        return False
+    return bool(changed) and changed <= set(props)
+
+# 図表のトレースだけを差し替える部分更新。layout_pathsに挙げたレイアウトの値も合わせて更新する
+# 軸や枠線などそれ以外のレイアウトはブラウザにあるものをそのまま使う
+def patch_figure(figure, layout_paths=()):
+    patch = dash.Patch()
+    patch['data'] = figure['data']
+    for path in layout_paths:
+        value = figure['layout']
+        target = patch['layout']
+        for key in path[:-1]:
+            value = value.get(key, {})
+            target = target[key]
+        target[path[-1]] = value.get(path[-1])
+    # Patchのままだとorjsonで直接書き出せず、plotlyが全ての値を1つずつ変換し直して遅くなるので、送る形のdictにして返す
+    return patch.to_plotly_json()
+
+# 球種で絞り込んだ結果が空のときの位置
+NO_ROWS = np.array([], dtype='intp')
+
+# 日付順の配列datesの中で、selected_dateの日の最初の位置（その日が無ければNone）
+def first_position(dates, selected_date):
+    target = pd.Timestamp(selected_date) if selected_date else pd.NaT
+    if pd.isna(target):
+        return None
+    position = np.searchsorted(dates, target.to_datetime64(), side='left')
+    if position == len(dates) or dates[position] != target.to_datetime64():
+        return None
+    return int(position)
+
+# テーブルをDataTableに渡す形（data, columns）にする
+def table_data(table):
+    return [table.to_dict('records'), [{"name": i, "id": i} for i in table.columns]]
+
+
+# コールバック: 選手画像（選手にだけ依存）
+@app.callback(
+    Output('player-image', 'src'),
+    Input('name-dropdown', 'value')
+)
+@metrics.timed_callback
+def update_player_image(selected_name):
+    # 画像はURLだけを返し、加工済みの画像は/player-imageから配信する
+    return portraits.portrait_url(selected_name)
+
+
+# コールバック: 平均値テーブル
+@server_callback(
+    [Output('summary-table', 'data'),
      Output('summary-table', 'columns'),
      Output('summary-table2', 'data'),
-     Output('summary-table2', 'columns'),
-     Output('date-dropdown', 'options'),
-     Output('date-dropdown', 'value'),
-     Output('zone-pt-dropdown', 'options')],
+     Output('summary-table2', 'columns')],
     [Input('name-dropdown', 'value'),
      Input('date-picker-range', 'start_date'),
-     Input('date-picker-range', 'end_date'),
-     Input('y-axis-value-dropdown', 'value'),]
+     Input('date-picker-range', 'end_date')]
 )
+@metrics.timed_callback
+def update_tables(selected_name, start_date, end_date):
+    dataset = current_dataset()
+    selection = (selected_name, start_date, end_date)
+    observe_selection(dataset, selection)
 
+    # テーブルは集計キューブから作るので、投球ごとの行は読まない（球種ごとの集計は散布図・リリース角度と共有）
+    mean_table, mean_table_columns = cached(dataset, 'mean_table', selection, (), lambda df: table_data(
+        summary_cube.build_table(dataset.totals(*selection), summary_cube.MEAN_TABLE)))
 
+    mean_table2, mean_table2_columns = cached(dataset, 'mean_table2', selection, (), lambda df: table_data(
+        summary_cube.build_table(dataset.totals(*selection), summary_cube.MEAN_TABLE2)))
 
+    return mean_table, mean_table_columns, mean_table2, mean_table2_columns
 
-def update_graphs(selected_name, start_date, end_date, y_axis):
-    filtered_df = df[
-        (df['名前'] == selected_name) &
-        (df['日付'] >= start_date) &
-        (df['日付'] <= end_date)
-    ]
-    
-    color_map = functions.set_palette()
-    
-    scatter_fig = functions.mov_plot(filtered_df, 'spin', color_map)
-    
-    scatter_fig2 = functions.mov_plot(filtered_df, 'trajectory', color_map)
-    
-    release_plot = functions.release_plot(filtered_df, 'Release Side', 'Release Height', color_map, -2, 2)
-    
-    release_angle_plot = functions.release_angle(filtered_df, color_map)
-    
-    extension_plot = functions.release_plot(filtered_df, 'Release Extension (m)', 'Release Height', color_map, 0, 3)
-    
-    violin_fig = functions.violin_plot(filtered_df, y_axis, color_map)
-    
-    line_plot = functions.line_plot(filtered_df, y_axis, color_map)
 
-    mean_table = functions.mean_table(filtered_df)
-    
-    mean_table_columns = [{"name": i, "id": i} for i in mean_table.columns]
-    
-    mean_table2 = functions.mean_table2(filtered_df)
-    
-    mean_table2_columns = [{"name": i, "id": i} for i in mean_table2.columns]
-    
+# コールバック: 変化量の散布図
+@server_callback(
+    [Output('scatter-plot', 'figure'),
+     Output('scatter-plot2', 'figure')],
+    [Input('name-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date')]
+)
+@metrics.timed_callback
+def update_movement(selected_name, start_date, end_date):
+    dataset = current_dataset()
+    selection = (selected_name, start_date, end_date)
+    observe_selection(dataset, selection)
+
+    # 平均マーカーと分布の楕円は集計キューブから取る
+    def build(df, sp_or_trj):
+        totals = dataset.totals(*selection)
+        means = summary_cube.pitch_type_means(totals, [f'HB ({sp_or_trj})', f'VB ({sp_or_trj})'])
+        return functions.mov_plot(df, sp_or_trj, color_map, means, pitch_profile.ellipses(totals, sp_or_trj))
+
+    scatter_fig = cached(dataset, 'mov_plot', selection, ('spin',), lambda df: build(df, 'spin'))
+
+    scatter_fig2 = cached(dataset, 'mov_plot', selection, ('trajectory',), lambda df: build(df, 'trajectory'))
+
+    return scatter_fig, scatter_fig2
+
+
+# コールバック: リリース位置・角度・エクステンション
+@server_callback(
+    [Output('release-plot', 'figure'),
+     Output('release-angle-plot', 'figure'),
+     Output('extension-plot', 'figure')],
+    [Input('name-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date')]
+)
+@metrics.timed_callback
+def update_release(selected_name, start_date, end_date):
+    dataset = current_dataset()
+    selection = (selected_name, start_date, end_date)
+    observe_selection(dataset, selection)
+
+    release_plot = cached(dataset, 'release_plot', selection, ('Release Side', 'Release Height', -2, 2),
+                          lambda df: functions.release_plot(df, 'Release Side', 'Release Height', color_map, -2, 2))
+
+    release_angle_plot = cached(dataset, 'release_angle', selection, (),
+                                lambda df: functions.release_angle(df, color_map, summary_cube.pitch_type_means(
+                                    dataset.totals(*selection), ['Release Angle'])))
+
+    extension_plot = cached(dataset, 'release_plot', selection, ('Release Extension (m)', 'Release Height', 0, 3),
+                            lambda df: functions.release_plot(df, 'Release Extension (m)', 'Release Height', color_map, 0, 3))
+
+    return release_plot, release_angle_plot, extension_plot
+
+
+# コールバック: バイオリンプロットと推移グラフ（Y軸の変更はここだけに届く）
+@server_callback(
+    [Output('violin-plot', 'figure'),
+     Output('line-plot', 'figure')],
+    [Input('name-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('y-axis-value-dropdown', 'value')]
+)
+@metrics.timed_callback
+def update_distribution(selected_name, start_date, end_date, y_axis):
+    dataset = current_dataset()
+    selection = (selected_name, start_date, end_date)
+    observe_selection(dataset, selection)
+
+    violin_fig = cached(dataset, 'violin_plot', selection, (y_axis,),
+                        lambda df: functions.violin_plot(df, y_axis, color_map, dataset.pitch_type_rows(*selection)))
+
+    # 推移は集計キューブの日・週・月ごとの表から、日付範囲の長さに合った解像度で作る
+    line_plot = cached(dataset, 'line_plot', selection, (y_axis,),
+                       lambda df: functions.line_plot(df, y_axis, color_map,
+                                                      *dataset.cube.trend(*selection, y_axis)))
+
+    # Y軸だけが変わったときは、トレースとY軸に連動するタイトルだけを送る
+    if only_changed('y-axis-value-dropdown.value'):
+        layout_paths = [('title', 'text'), ('yaxis', 'title', 'text')]
+        return patch_figure(violin_fig, layout_paths), patch_figure(line_plot, layout_paths)
+    return violin_fig, line_plot
+
+
+# コールバック: 動画の日付とゾーンの球種の選択肢
+@server_callback(
+    [Output('date-dropdown', 'options'),
+     Output('date-dropdown', 'value'),
+     Output('zone-pt-dropdown', 'options')],
+    [Input('name-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date')]
+)
+@metrics.timed_callback
+def update_options(selected_name, start_date, end_date):
+    filtered_df = current_dataset().slice(selected_name, start_date, end_date)
+    metrics.observe_rows(len(filtered_df))
 
-    # 画像の取得・処理
-    local_image_path = f'player_images/{selected_name}.png'
-    if os.path.exists(local_image_path):
-        with open(local_image_path, "rb") as f:
-            image_bytes = f.read()
-        image_src = process_image_to_square_base64_with_transparency(image_bytes)
-    else:
-        image_src = 'assets/rapsodo_logo.png'  # または '/assets/no_image.png' 等
-            
-    
     options = [{'label': d, 'value': d} for d in sorted(filtered_df['日付'].unique())]
     value = options[0]['value'] if options else None
-    
-    zone_pt_options = filtered_df['球種'].unique()
 
-    return (
-        scatter_fig, scatter_fig2, release_plot, release_angle_plot, extension_plot,
-        violin_fig, line_plot, 
-        image_src, mean_table.to_dict('records'), mean_table_columns, mean_table2.to_dict('records'), mean_table2_columns,
-        options, value,
-        zone_pt_options
-        )
+    zone_pt_options = filtered_df['球種'].dropna().unique().tolist()
 
+    return options, value, zone_pt_options
 
 
 
-@app.callback(
-    [Output('youtube-player', 'children'),
-     Output('zone-plot', 'figure'),
-     Output('zone-plot2', 'figure')],
+
+@server_callback(
+    Output('youtube-player', 'children'),
     [Input('name-dropdown', 'value'),
      Input('date-picker-range', 'start_date'),  
      Input('date-picker-range', 'end_date'),   
-     Input('date-dropdown', 'value'),
-     Input('zone-pt-dropdown', 'value')]
+     Input('date-dropdown', 'value')]
 )
-def update_video_embed(selected_name, start_date, end_date, selected_date, pt):
-    filtered_df = df[
-        (df['名前'] == selected_name) &
-        (df['日付'] >= start_date) &
-        (df['日付'] <= end_date)
-    ]
-    row = filtered_df[filtered_df['日付'] == selected_date].head(1)
-    if row.empty:
+@metrics.timed_callback
+def update_video_embed(selected_name, start_date, end_date, selected_date):
+    filtered_df = current_dataset().slice(selected_name, start_date, end_date)
+    metrics.observe_rows(len(filtered_df))
+    # 絞り込み結果は日付順なので、選んだ日の最初の投球を二分探索で探す
+    position = first_position(filtered_df['日付'].values, selected_date)
+    if position is None:
         return html.Div("動画はありません")
 
-    video_link = row.iloc[0].get('VideoLink', None)
+    video_link = filtered_df['VideoLink'].iloc[position] if 'VideoLink' in filtered_df.columns else None
     embed_url = functions.get_youtube_embed_url(video_link)
     
     if embed_url:
-        return_url = html.Iframe(src=embed_url, width="560", height="315", style={'border': 'none', 'max-width': '100%'})
-    else:
-        return_url =  html.Div("動画が登録されていません")
-    
-    
-    for_zone_df = filtered_df[filtered_df['球種'] == pt]
-    zone_plot = functions.zone_plot(for_zone_df, 'density')
-    zone_plot2 = functions.zone_plot(for_zone_df, 'point')
-    
-    
-    
-    return return_url, zone_plot, zone_plot2
+        return html.Iframe(src=embed_url, width="560", height="315", style={'border': 'none', 'max-width': '100%'})
+    return html.Div("動画が登録されていません")
+
+
+# コールバック: 投球位置（ゾーンの球種の変更はここだけに届く）
+@server_callback(
+    [Output('zone-plot', 'figure'),
+     Output('zone-plot2', 'figure')],
+    [Input('name-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('zone-pt-dropdown', 'value')]
+)
+@metrics.timed_callback
+def update_zone(selected_name, start_date, end_date, pt):
+    dataset = current_dataset()
+    selection = (selected_name, start_date, end_date)
+    observe_selection(dataset, selection)
+
+    # 球種で絞り込んだ位置は2つの図と、球種を切り替えたときの再描画で使い回す
+    rows = lambda: dataset.pitch_type_rows(*selection).get(pt, NO_ROWS)
+    zone_plot = cached(dataset, 'zone_plot', selection, (pt, 'density'),
+                       lambda df: functions.zone_plot(df, 'density', rows()))
+    zone_plot2 = cached(dataset, 'zone_plot', selection, (pt, 'point'),
+                        lambda df: functions.zone_plot(df, 'point', rows()))
+
+    # 球種だけが変わったときは、ストライクゾーンの枠線や軸は同じなのでトレースだけを送る
+    if only_changed('zone-pt-dropdown.value'):
+        return patch_figure(zone_plot), patch_figure(zone_plot2)
+    return zone_plot, zone_plot2
+
+
+# ---- クライアント側で絞り込むモード ----
+
+if CLIENT_FILTERING:
+    # 選手のデータ（選手の選択ごとに1回だけサーバーで作る）
+    @app.callback(
+        Output('player-data', 'data'),
+        Input('name-dropdown', 'value')
+    )
+    @metrics.timed_callback
+    def update_player_data(selected_name):
+        dataset = current_dataset()
+        selection = (selected_name, None, None)
+        observe_selection(dataset, selection)
+        return cached(dataset, 'player_data', selection, (), client_data.player_payload)
+
+    selection_inputs = [Input('player-data', 'data'),
+                        Input('date-picker-range', 'start_date'),
+                        Input('date-picker-range', 'end_date')]
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_tables'),
+        [Output('summary-table', 'data'), Output('summary-table', 'columns'),
+         Output('summary-table2', 'data'), Output('summary-table2', 'columns')],
+        selection_inputs
+    )
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_movement'),
+        [Output('scatter-plot', 'figure'), Output('scatter-plot2', 'figure')],
+        selection_inputs
+    )
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_release'),
+        [Output('release-plot', 'figure'), Output('release-angle-plot', 'figure'), Output('extension-plot', 'figure')],
+        selection_inputs
+    )
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_distribution'),
+        [Output('violin-plot', 'figure'), Output('line-plot', 'figure')],
+        selection_inputs + [Input('y-axis-value-dropdown', 'value')]
+    )
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_options'),
+        [Output('date-dropdown', 'options'), Output('date-dropdown', 'value'), Output('zone-pt-dropdown', 'options')],
+        selection_inputs
+    )
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_video_embed'),
+        Output('youtube-player', 'children'),
+        [Input('player-data', 'data'), Input('date-dropdown', 'value')]
+    )
+    app.clientside_callback(
+        ClientsideFunction('rapsodo', 'update_zone'),
+        [Output('zone-plot', 'figure'), Output('zone-plot2', 'figure')],
+        selection_inputs + [Input('zone-pt-dropdown', 'value')]
+    )
 
     
     
@@ -0,0 +1,229 @@
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import g, has_request_context, request, Response
+
+
+# ヒストグラムの区切り（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 遅いリクエストのスタックを記録するしきい値（ミリ秒）。未設定ならプロファイラは動かない
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Summary:
+    def __init__(self):
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+
+
+# (メトリクス名, ラベル) ごとの値
+_histograms = defaultdict(Histogram)
+_summaries = defaultdict(Summary)
+
+
+def observe(kind, name, seconds):
+    with _lock:
+        _histograms[(f'dash_{kind}_seconds', name)].observe(seconds)
+    if has_request_context():
+        g.setdefault('metrics_timings', []).append((kind, name, seconds))
+
+
+# 処理時間を計る。リクエスト中であればServer-Timingヘッダにも載せる
+class timer:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.kind, self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Dashのコールバックを計測するデコレータ（@app.callbackの内側に付ける）
+def timed_callback(f):
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        if has_request_context():
+            g.metrics_callback = f.__name__
+        with timer('callback', f.__name__):
+            return f(*args, **kwargs)
+    return decorated
+
+# コールバックで絞り込んだ投球数を記録する
+def observe_rows(rows):
+    if has_request_context():
+        g.metrics_rows = rows
+
+
+# Server-Timingのメトリクス名に使えない文字を置き換える
+def _token(name):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+# ---- サンプリングプロファイラ（遅いリクエストのスタックをflamegraph用の形式で保存する） ----
+
+_active = {}
+_sampler = None
+
+
+def _frame_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+def _sample_loop():
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        if not _active:
+            continue
+        frames = sys._current_frames()
+        for thread_id, samples in list(_active.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                samples[_frame_stack(frame)] += 1
+
+def _start_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name='metrics-sampler', daemon=True)
+            _sampler.start()
+
+def _dump_profile(samples, name, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{_token(name)}-{elapsed_ms:.0f}ms.folded')
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+
+
+# ---- Flaskへの組み込み ----
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    if PROFILE_SLOW_MS > 0:
+        _active[threading.get_ident()] = Counter()
+
+def _after_request(response):
+    start = g.get('metrics_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    samples = _active.pop(threading.get_ident(), None)
+
+    callback = g.get('metrics_callback')
+    if callback is not None:
+        with _lock:
+            _histograms[('dash_request_seconds', callback)].observe(elapsed)
+            if not response.is_streamed:
+                _summaries[('dash_callback_payload_bytes', callback)].observe(len(response.get_data()))
+            rows = g.get('metrics_rows')
+            if rows is not None:
+                _summaries[('dash_callback_rows', callback)].observe(rows)
+
+    timings = g.get('metrics_timings', [])
+    if timings:
+        entries = [f'{_token(name)};desc="{kind}";dur={seconds*1000:.1f}' for kind, name, seconds in timings]
+        entries.append(f'total;dur={elapsed*1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(entries)
+
+    if samples and elapsed * 1000 >= PROFILE_SLOW_MS:
+        try:
+            _dump_profile(samples, callback or request.path, elapsed * 1000)
+        except OSError as e:
+            print(f"プロファイルの保存に失敗しました: {e}")
+    return response
+
+def _teardown_request(exc):
+    _active.pop(threading.get_ident(), None)
+
+
+def _labels(metric, name):
+    label = 'builder' if metric.startswith('dash_builder') else 'callback'
+    escaped = name.replace('\\', '\\\\').replace('"', '\\"')
+    return f'{label}="{escaped}"'
+
+# Prometheusのテキスト形式で出力する
+def render(extra=None):
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        summaries = sorted((key, (s.sum, s.count)) for key, s in _summaries.items())
+        histograms = [(key, (list(h.counts), h.sum, h.count)) for key, h in histograms]
+
+    declared = set()
+    for (metric, name), (counts, total, count) in histograms:
+        if metric not in declared:
+            lines.append(f'# TYPE {metric} histogram')
+            declared.add(metric)
+        labels = _labels(metric, name)
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'{metric}_sum{{{labels}}} {total}')
+        lines.append(f'{metric}_count{{{labels}}} {count}')
+    for (metric, name), (total, count) in summaries:
+        if metric not in declared:
+            lines.append(f'# TYPE {metric} summary')
+            declared.add(metric)
+        labels = _labels(metric, name)
+        lines.append(f'{metric}_sum{{{labels}}} {total}')
+        lines.append(f'{metric}_count{{{labels}}} {count}')
+
+    for metric, value in (extra or {}).items():
+        lines.append(f'# TYPE {metric} {"counter" if metric.endswith("_total") else "gauge"}')
+        lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# 計測のフックと/metricsを登録する。extraは追加で出す値（名前→数値）を返す関数
+# 認証はアプリ全体のbefore_requestで掛かるので、/metricsも同じ認証が必要になる
+def init_app(server, extra=None):
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.teardown_request(_teardown_request)
+    if PROFILE_SLOW_MS > 0:
+        _start_sampler()
+
+    @server.route('/metrics')
+    def metrics_endpoint():
+        return Response(render(extra() if extra else None), mimetype='text/plain; version=0.0.4')
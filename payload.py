@@ -0,0 +1,126 @@
+import base64
+import datetime
+import gzip
+import os
+import numpy as np
+from flask import request
+from plotly.basedatatypes import BaseFigure
+
+# brotliは任意（pip install Brotli）。無ければgzipだけを使う
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# 図表の数値を丸める桁数。センサーの精度（最も細かい列で小数2桁）より細かいので計測値は変わらず、
+# float32で持っている値をJSONにしたときの 17.299999237060547 のような端数だけが消える
+FIGURE_DECIMALS = int(os.getenv('FIGURE_DECIMALS', '3'))
+# これより短い配列はそのままリストで送る（型付き配列にしても短くならない）
+TYPED_ARRAY_MIN = 16
+# 整数の配列を型付き配列（base64）で送るときの型。小さい順に、値が収まる最初のものを使う
+INT_TYPES = [('i1', '<i1'), ('i2', '<i2'), ('i4', '<i4')]
+
+# 1ならコールバックの応答を圧縮する（ブラウザが対応していればbrotli、なければgzip）
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', '1') == '1'
+COMPRESS_PATHS = ('/_dash-update-component', '/_dash-layout')
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+# ---- 図表のJSONを小さくする ----
+
+# 数値の配列を送る形にする。丸めた結果が整数だけなら型付き配列（{dtype, bdata}）、それ以外は丸めたリスト
+# 小数を含む配列は、丸めた後のリストの方がfloat64の型付き配列より短い
+def encode_array(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        # +0.0で丸めて出た-0.0を0.0にする
+        values = np.round(values.astype('float64'), FIGURE_DECIMALS) + 0.0
+    elif values.dtype.kind not in 'iu':
+        return values
+    finite = np.isfinite(values)
+    if values.size >= TYPED_ARRAY_MIN and finite.all() and (values == np.trunc(values)).all():
+        lo, hi = values.min(), values.max()
+        for name, dtype in INT_TYPES:
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                typed = {'dtype': name, 'bdata': base64.b64encode(values.astype(dtype).tobytes()).decode('ascii')}
+                if values.ndim > 1:
+                    typed['shape'] = ', '.join(str(n) for n in values.shape)
+                return typed
+    if values.dtype.kind == 'f' and (values == np.trunc(values))[finite].all():
+        # 整数値のfloatは 2345.0 ではなく 2345 と書き出す
+        values = np.where(finite, values, 0).astype('int64').astype(object)
+    else:
+        values = values.astype(object)
+    values[~finite] = None
+    return values.tolist()
+
+# ホバーに出す日付（時刻がすべて0時のもの）を 2023-02-03T00:00:00 ではなく 2023-02-03 にする
+# 日付の表と番号（型付き配列）に分けて重複を省くことはしない。plotly.jsのhovertemplateは
+# %{customdata[0]|%Y-%m-%d} の値を文字列として日付に解釈するので数値の番号からは日付を引けず、
+# ブラウザ側で図表を書き換える仕組みが要る。日付順に並んだ同じ文字列は圧縮でほぼ消える
+# （変化量の散布図で、日付を除いても圧縮後は2〜4KBしか減らない）
+def encode_dates(values):
+    flat = values.ravel()
+    if not len(flat) or not all(isinstance(v, datetime.datetime) for v in flat):
+        return values
+    stamps = np.array(flat, dtype='datetime64[s]')
+    days = stamps.astype('datetime64[D]')
+    if (stamps != days).any():
+        return values
+    return np.datetime_as_string(days).reshape(values.shape).tolist()
+
+def _slim(value):
+    if isinstance(value, dict):
+        return {key: _slim(item) for key, item in value.items()}
+    if isinstance(value, np.ndarray):
+        return encode_dates(value) if value.dtype == object else encode_array(value)
+    if isinstance(value, list) and value and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+        return encode_array(value)
+    if isinstance(value, (list, tuple)) and any(isinstance(v, dict) for v in value):
+        return [_slim(item) for item in value]
+    return value
+
+# 図表をブラウザに送る形（dict）にして、トレースの数値を丸め・型付き配列にする
+# 図表以外（テーブルなど）はそのまま返す。レイアウトは小さいので手を付けない
+def slim(value):
+    if not isinstance(value, BaseFigure):
+        return value
+    figure = value.to_plotly_json()
+    figure['data'] = [_slim(trace) for trace in figure['data']]
+    return figure
+
+
+# ---- 応答の圧縮 ----
+
+def _compress(response):
+    if (request.path not in COMPRESS_PATHS or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        body, encoding = brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    elif accepted['gzip']:
+        body, encoding = gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    else:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# 応答の圧縮を登録する
+# Flaskのafter_requestは登録と逆の順に呼ばれるので、metrics.init_appより先に呼ぶと
+# メトリクスには圧縮前の大きさが記録される
+def init_app(server):
+    if RESPONSE_COMPRESSION:
+        server.after_request(_compress)
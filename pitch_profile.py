@@ -0,0 +1,124 @@
+import functools
+import os
+import numpy as np
+import pandas as pd
+import summary_cube
+
+
+# 選手×球種ごとの変化量（HB, VB）の分布から、散布図に描く楕円と外れ値の投球を求める
+# 平均と共分散は集計キューブ（summary_cube）の合計・二乗和・積和から出すので、
+# セッションを追加したときもキューブの差分更新だけで済む
+
+# 楕円に含まれる投球の割合
+ELLIPSE_PROBABILITY = float(os.getenv('ELLIPSE_PROBABILITY', '0.95'))
+# マハラノビス距離がこの割合の範囲の外なら外れ値（球種の誤分類や計測ミスの候補）とする
+OUTLIER_PROBABILITY = float(os.getenv('OUTLIER_PROBABILITY', '0.99'))
+# 分布を推定する最低の投球数（これより少ない球種には楕円を描かず、外れ値の判定もしない）
+MIN_PITCHES = 10
+# 楕円を描く点の数
+ELLIPSE_POINTS = 73
+
+# 各投球の、その選手のその球種の分布からのマハラノビス距離の2乗（取り込み時に計算して列として持つ）
+DISTANCE_COLUMNS = {
+    'spin': 'Mahalanobis (spin)',
+    'trajectory': 'Mahalanobis (trajectory)',
+}
+
+
+# 自由度2のカイ二乗分布で、確率probabilityに対応する値（マハラノビス距離の2乗のしきい値）
+@functools.lru_cache(maxsize=None)
+def chi2_threshold(probability):
+    # scipyの読み込みは重いので、初めて使うときに読み込む
+    from scipy.stats import chi2
+    return float(chi2.ppf(probability, 2))
+
+
+# 集計表の各行の平均と共分散（投球数がMIN_PITCHES未満の行はNaN）
+def covariance(totals, sp_or_trj):
+    x_col, y_col = summary_cube.COVARIANCE_PAIRS[sp_or_trj]
+    key = summary_cube.pair_name(x_col, y_col)
+    if (key, 'n') not in totals.columns:
+        # 組の集計が無い古いキューブ
+        return pd.DataFrame(columns=['n', 'mean_x', 'mean_y', 'var_x', 'var_y', 'cov_xy'], dtype='float64')
+    n = totals[(key, 'n')].astype('float64')
+    mean_x = totals[(key, 'sum_x')] / n
+    mean_y = totals[(key, 'sum_y')] / n
+    result = pd.DataFrame({
+        'n': n,
+        'mean_x': mean_x,
+        'mean_y': mean_y,
+        'var_x': (totals[(key, 'sumsq_x')] - n * mean_x ** 2) / (n - 1),
+        'var_y': (totals[(key, 'sumsq_y')] - n * mean_y ** 2) / (n - 1),
+        'cov_xy': (totals[(key, 'sum_xy')] - n * mean_x * mean_y) / (n - 1),
+    })
+    return result.where(n >= MIN_PITCHES)
+
+
+# 球種ごとの集計（SummaryCube.by_pitch_type）から楕円の 中心・長径・短径・傾き（ラジアン）を求める
+def ellipses(totals, sp_or_trj, probability=None):
+    stats = covariance(totals, sp_or_trj)
+    a, b, c = stats['var_x'], stats['cov_xy'], stats['var_y']
+    # 2x2の共分散行列の固有値と、長軸の向き
+    half_sum = (a + c) / 2
+    radius = np.sqrt(((a - c) / 2) ** 2 + b ** 2)
+    scale = np.sqrt(chi2_threshold(probability or ELLIPSE_PROBABILITY))
+    result = pd.DataFrame({
+        'center_x': stats['mean_x'],
+        'center_y': stats['mean_y'],
+        'major': scale * np.sqrt(half_sum + radius),
+        'minor': scale * np.sqrt(np.maximum(half_sum - radius, 0)),
+        'angle': 0.5 * np.arctan2(2 * b, a - c),
+    })
+    return result.dropna().rename_axis('球種').reset_index()
+
+# 楕円の輪郭の座標
+def ellipse_path(center_x, center_y, major, minor, angle, points=ELLIPSE_POINTS):
+    t = np.linspace(0, 2 * np.pi, points)
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+    x = center_x + major * np.cos(t) * cos_a - minor * np.sin(t) * sin_a
+    y = center_y + major * np.cos(t) * sin_a + minor * np.sin(t) * cos_a
+    return x, y
+
+
+# 各投球の、(選手, 球種) ごとの分布からのマハラノビス距離の2乗をまとめて計算する
+# profilesは選手×球種ごとの集計（SummaryCube.by_player_pitch_type）。分布が無い投球はNaN
+def distances(names, pitch_types, x, y, profiles, sp_or_trj):
+    stats = covariance(profiles, sp_or_trj)
+    positions = stats.index.get_indexer(pd.MultiIndex.from_arrays([names, pitch_types]))
+    found = positions >= 0
+    rows = stats.to_numpy(dtype='float64')[np.where(found, positions, 0)]
+    rows[~found] = np.nan
+    mean_x, mean_y, var_x, var_y, cov_xy = (rows[:, stats.columns.get_loc(c)]
+                                            for c in ['mean_x', 'mean_y', 'var_x', 'var_y', 'cov_xy'])
+    dx, dy = x - mean_x, y - mean_y
+    det = var_x * var_y - cov_xy ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d2 = (var_y * dx ** 2 - 2 * cov_xy * dx * dy + var_x * dy ** 2) / det
+    return np.where(det > 0, d2, np.nan).astype('float32')
+
+# dfにマハラノビス距離の列を付けて返す（作ったばかりのdfに列を足すので、共有中のデータには使わないこと）
+# namesを渡すとその選手の行だけ計算し直す（セッションを追加した選手だけ分布が変わるため）
+def with_distances(df, cube, names=None):
+    profiles = cube.by_player_pitch_type()
+    mask = np.ones(len(df), dtype=bool) if names is None else df['名前'].isin(names).to_numpy()
+    for sp_or_trj, column in DISTANCE_COLUMNS.items():
+        x_col, y_col = summary_cube.COVARIANCE_PAIRS[sp_or_trj]
+        if column in df.columns:
+            values = df[column].to_numpy(dtype='float32', copy=True)
+        else:
+            values = np.full(len(df), np.nan, dtype='float32')
+        if mask.any():
+            values[mask] = distances(
+                df['名前'].to_numpy()[mask], df['球種'].to_numpy()[mask],
+                df[x_col].to_numpy(dtype='float64')[mask], df[y_col].to_numpy(dtype='float64')[mask],
+                profiles, sp_or_trj
+            )
+        df[column] = values
+    return df
+
+# 外れ値の投球（距離の列が無いデータではすべてFalse）
+def outliers(df, sp_or_trj, probability=None):
+    column = DISTANCE_COLUMNS[sp_or_trj]
+    if column not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return (df[column] > chi2_threshold(probability or OUTLIER_PROBABILITY)).to_numpy()
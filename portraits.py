@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+from urllib.parse import quote
+import numpy as np
+from PIL import Image
+
+
+IMAGE_DIR = 'player_images'
+# 透過にする背景色と許容差
+BG_COLOR = (244, 247, 246)
+BG_TOLERANCE = 10
+# 画面上は200px表示なので、高解像度ディスプレイ向けに2倍で作る
+THUMBNAIL_SIZE = int(os.getenv('PORTRAIT_SIZE', '400'))
+# ファイルが見つからない選手に使う画像
+FALLBACK_URL = 'assets/rapsodo_logo.png'
+
+_cache = {}
+_lock = threading.Lock()
+
+
+# 背景を透過して中央を正方形に切り抜き、サムネイルのPNGを返す
+def make_portrait(image_bytes, size=THUMBNAIL_SIZE):
+    img = Image.open(io.BytesIO(image_bytes)).convert('RGBA')
+    pixels = np.array(img)
+
+    diff = np.abs(pixels[..., :3].astype(np.int16) - np.array(BG_COLOR, dtype=np.int16))
+    pixels[(diff < BG_TOLERANCE).all(axis=-1)] = (255, 255, 255, 0)
+
+    height, width = pixels.shape[:2]
+    new_size = min(width, height)
+    top = (height - new_size) // 2
+    left = (width - new_size) // 2
+    square = Image.fromarray(pixels[top:top + new_size, left:left + new_size])
+    if new_size > size:
+        square = square.resize((size, size), Image.LANCZOS)
+
+    buffered = io.BytesIO()
+    square.save(buffered, format='PNG', optimize=True)
+    return buffered.getvalue()
+
+
+def _image_path(name):
+    # URLから来た名前でディレクトリの外を参照させない
+    if not name or os.path.basename(name) != name:
+        return None
+    path = os.path.join(IMAGE_DIR, f'{name}.png')
+    return path if os.path.isfile(path) else None
+
+# 元ファイルの更新日時とサイズ、サムネイルサイズから決まるETag
+def _etag(path):
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}-{THUMBNAIL_SIZE}'
+
+
+# 加工済みの画像とETagを返す。画像が無ければNone
+def get_portrait(name):
+    path = _image_path(name)
+    if path is None:
+        return None
+    etag = _etag(path)
+    cached = _cache.get(name)
+    if cached is not None and cached[1] == etag:
+        return cached
+
+    with _lock:
+        cached = _cache.get(name)
+        if cached is not None and cached[1] == etag:
+            return cached
+        with open(path, 'rb') as f:
+            body = make_portrait(f.read())
+        _cache[name] = (body, etag)
+        return body, etag
+
+
+# 画像のURL。ETagをクエリに含めるので、画像が変わればURLも変わる
+def portrait_url(name):
+    path = _image_path(name)
+    if path is None:
+        return FALLBACK_URL
+    return f'/player-image/{quote(name)}.png?v={_etag(path)}'
+
+
+# 起動時にすべての画像を加工しておく
+def warm():
+    if not os.path.isdir(IMAGE_DIR):
+        return
+    for filename in os.listdir(IMAGE_DIR):
+        name, ext = os.path.splitext(filename)
+        if ext == '.png':
+            try:
+                get_portrait(name)
+            except Exception as e:
+                print(f"画像処理エラー（透過）: {e}")
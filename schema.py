@@ -0,0 +1,79 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# アプリが使う列と、メモリ上での型
+# 名前・球種・フラグ・動画リンクは同じ値の繰り返しなのでカテゴリ型、計測値はfloat32で持つ
+CATEGORY_COLUMNS = ['名前', '球種', 'Is Strike', 'VideoLink']
+MEASUREMENT_COLUMNS = [
+    'Velocity', 'Total Spin', 'True Spin (release)', 'Spin Efficiency (release)',
+    'VB (trajectory)', 'HB (trajectory)', 'VB (spin)', 'HB (spin)',
+    'Release Angle', 'Release Height', 'Release Side',
+    'Horizontal Approach Angle', 'Vertical Approach Angle',
+    'Release Extension (ft)', 'Strike Zone Side', 'Strike Zone Height',
+]
+DATE_COLUMN = '日付'
+USE_COLUMNS = [CATEGORY_COLUMNS[0], DATE_COLUMN] + CATEGORY_COLUMNS[1:] + MEASUREMENT_COLUMNS
+
+# CSVを何行ずつ解析するか。一度に解析すると文字列の列が一時的に元の数倍のメモリを使う
+CSV_CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', '50000'))
+
+DTYPES = {
+    **{column: 'category' for column in CATEGORY_COLUMNS},
+    **{column: 'float32' for column in MEASUREMENT_COLUMNS},
+}
+
+
+# 必要な列だけを型付きで読み込む
+# CSV_CHUNK_ROWS行ずつ型付きの列にしてからつなぐので、ストリームを渡せばダウンロードしながら解析できる
+def read_csv(source, **kwargs):
+    chunks = []
+    for chunk in pd.read_csv(source, usecols=lambda column: column in USE_COLUMNS, dtype=DTYPES,
+                             chunksize=CSV_CHUNK_ROWS, **kwargs):
+        if DATE_COLUMN in chunk.columns:
+            chunk[DATE_COLUMN] = pd.to_datetime(chunk[DATE_COLUMN])
+        chunks.append(chunk)
+    return concat(chunks, consume=True)
+
+
+# 同じ列を持つデータを縦につなぐ。カテゴリ型はカテゴリを合わせてカテゴリ型のまま残す
+# （pd.concatはカテゴリが違うとobject型に戻してしまう）
+# consume=Trueなら、メモリを抑えるため渡したデータからつなぎ終えた列を消していく
+def concat(frames, consume=False):
+    frames = [df for df in frames if df is not None]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    if not frames or not any(len(df) for df in frames):
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    # 列が揃っていなければ（古い書き出し形式が混ざっているなど）、pandasでつないで型を揃え直す
+    if any(list(df.columns) != list(frames[0].columns) for df in frames):
+        return apply(pd.concat(frames, ignore_index=True))
+    columns = {}
+    for column in frames[0].columns:
+        parts = [df[column].array for df in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals(parts, ignore_order=True)
+        else:
+            columns[column] = np.concatenate([np.asarray(part) for part in parts])
+        del parts
+        if consume:
+            for df in frames:
+                del df[column]
+    return pd.DataFrame(columns, copy=False)
+
+
+# 読み込み済みのデータ（古いスナップショットなど）を同じ型に揃える
+def apply(df):
+    df = df[[column for column in USE_COLUMNS if column in df.columns]]
+    casts = {column: dtype for column, dtype in DTYPES.items() if column in df.columns and df[column].dtype != dtype}
+    if casts:
+        df = df.astype(casts)
+    if DATE_COLUMN in df.columns and not pd.api.types.is_datetime64_any_dtype(df[DATE_COLUMN]):
+        df = df.assign(**{DATE_COLUMN: pd.to_datetime(df[DATE_COLUMN])})
+    return df
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -0,0 +1,133 @@
+import fcntl
+import json
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+
+# ワーカー間で共有するデータの置き場所（未設定なら各ワーカーが自分で読み込む）
+SHARED_DATA_DIR = os.getenv('SHARED_DATA_DIR')
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.refresh.lock'
+
+
+# 前処理済みのデータを列ごとの.npyファイルに書き出し、CURRENTを新しい版に切り替える
+# 集計キューブは小さいのでpickleで一緒に置く
+def write(root, df, version, cube=None):
+    os.makedirs(root, exist_ok=True)
+    name = f'v{version}-{os.getpid()}'
+    directory = os.path.join(root, name)
+    os.makedirs(directory, exist_ok=True)
+
+    columns = []
+    for i, column in enumerate(df.columns):
+        series = df[column]
+        path = os.path.join(directory, f'{i}.npy')
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(path, series.cat.codes.to_numpy())
+            columns.append({'name': column, 'kind': 'category', 'categories': series.cat.categories.tolist()})
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            np.save(path, series.to_numpy(dtype='datetime64[ns]').view('int64'))
+            columns.append({'name': column, 'kind': 'datetime'})
+        else:
+            np.save(path, series.to_numpy())
+            columns.append({'name': column, 'kind': 'array'})
+    if cube is not None:
+        with open(os.path.join(directory, 'cube.pkl'), 'wb') as f:
+            pickle.dump(cube, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'rows': len(df), 'columns': columns}, f, ensure_ascii=False)
+
+    # 読み込み中のワーカーが中途半端な版を見ないよう、書き終えてから切り替える
+    previous = current_name(root)
+    current = os.path.join(root, CURRENT_FILE)
+    with open(current + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(current + '.tmp', current)
+    _remove_old(root, keep={name, previous})
+    return name
+
+# 古い版を消す（マップ済みのワーカーは削除後もそのまま読める）
+# 直前の版は、切り替えの瞬間に読み始めたワーカーのために残しておく
+def _remove_old(root, keep):
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        if entry.startswith('v') and entry not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def current_name(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def current_version(root):
+    name = current_name(root)
+    if name is None:
+        return None
+    with open(os.path.join(root, name, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)['version']
+
+
+# 現在の版を読み取り専用でメモリマップする。列はコピーせずにファイルを直接参照する
+# 戻り値は (データ, バージョン, 集計キューブ)。known_versionと同じならNone
+def read(root, known_version=None):
+    name = current_name(root)
+    if name is None:
+        raise FileNotFoundError(f'共有データがありません: {root}')
+    directory = os.path.join(root, name)
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['version'] == known_version:
+        return None
+
+    data = {}
+    for i, column in enumerate(meta['columns']):
+        values = np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+        if column['kind'] == 'category':
+            data[column['name']] = pd.Categorical.from_codes(values, categories=column['categories'], validate=False)
+        elif column['kind'] == 'datetime':
+            data[column['name']] = values.view('datetime64[ns]')
+        else:
+            data[column['name']] = values
+    df = pd.DataFrame(data, copy=False)
+
+    cube = None
+    cube_path = os.path.join(directory, 'cube.pkl')
+    if os.path.exists(cube_path):
+        with open(cube_path, 'rb') as f:
+            cube = pickle.load(f)
+    return df, meta['version'], cube
+
+
+# 元データ（Drive/ローカルCSV）に変更があれば共有データを作り直す
+# 同時に作り直すのは1プロセスだけで、他のプロセスは待たずに今の版を使う
+# 直近min_interval秒以内に他のプロセスが確認済みなら元データは見に行かない
+def refresh(root, load, prepare, block=False, min_interval=0):
+    os.makedirs(root, exist_ok=True)
+    lock_path = os.path.join(root, LOCK_FILE)
+    with open(lock_path, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        try:
+            known_version = current_version(root) if current_name(root) else None
+            if known_version is not None and time.time() - os.path.getmtime(lock_path) < min_interval:
+                return False
+            os.utime(lock_path)
+            result = load(known_version)
+            if result is None:
+                return False
+            raw, version = result
+            df, cube = prepare(raw)
+            write(root, df, version, cube)
+            return True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,282 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+# 集計しておく指標
+METRICS = [
+    'Velocity', 'Total Spin', 'True Spin (release)', 'Spin Efficiency (release)',
+    'VB (trajectory)', 'HB (trajectory)', 'VB (spin)', 'HB (spin)',
+    'Release Angle', 'Release Height', 'Release Side',
+    'Horizontal Approach Angle', 'Vertical Approach Angle',
+    'Release Extension (ft)', 'Release Extension (m)',
+]
+KEYS = ['名前', '日付', '球種']
+# 共分散を持っておく列の組（変化量の楕円・外れ値の判定用）
+COVARIANCE_PAIRS = {
+    'spin': ('HB (spin)', 'VB (spin)'),
+    'trajectory': ('HB (trajectory)', 'VB (trajectory)'),
+}
+
+
+# 選手×日×球種ごとに 投球数・ストライク数・各指標の件数/合計/二乗和/最大 を持つ表を作る
+# byでキーを変えられる（生の投球データから球種ごとの表を直接作るときは by=['球種']）
+# 集計する値（投球数・ストライク・指標・二乗・列の組の積）を1つのfloat64の表に並べ、1回のグループ分けで集計する
+def aggregate(df, by=None, metrics=None, pairs=True):
+    by = KEYS if by is None else by
+    metrics = [m for m in (METRICS if metrics is None else metrics) if m in df.columns]
+    keys = [df[key].dt.normalize() if key == '日付' else df[key] for key in by]
+    values = df[metrics].to_numpy(dtype='float64')
+
+    blocks = [np.ones(len(df)), (df['Is Strike'] == 'Y').to_numpy(dtype='float64'), values, values ** 2]
+    # 列の組ごとの 件数/合計/二乗和/積和（両方の値がある投球だけで数える）
+    pair_columns = []
+    for x_col, y_col in COVARIANCE_PAIRS.values() if pairs else ():
+        if x_col not in df.columns or y_col not in df.columns:
+            continue
+        x, y = df[x_col].to_numpy(dtype='float64'), df[y_col].to_numpy(dtype='float64')
+        both = ~(np.isnan(x) | np.isnan(y))
+        x, y = np.where(both, x, np.nan), np.where(both, y, np.nan)
+        blocks += [both.astype('float64'), x, y, x * x, y * y, x * y]
+        pair_columns.append(pair_name(x_col, y_col))
+    frame = pd.DataFrame(np.column_stack(blocks), index=df.index)
+
+    # 合計・件数・最大は同じグループ分けを使い回す（NaNは合計で0、件数では数えない）
+    grouped = frame.groupby(keys, sort=True, observed=True)
+    sums = grouped.sum()
+    index, sums = sums.index, sums.to_numpy()
+    counts, maxes = grouped.count().to_numpy(), grouped.max().to_numpy()
+
+    n = len(metrics)
+    parts = {('投球数', ''): sums[:, 0].astype('int64'), ('ストライク数', ''): sums[:, 1].astype('int64')}
+    for i, metric in enumerate(metrics):
+        parts[(metric, 'n')] = counts[:, 2 + i].astype('int64')
+        parts[(metric, 'sum')] = sums[:, 2 + i]
+        parts[(metric, 'sumsq')] = sums[:, 2 + n + i]
+        parts[(metric, 'max')] = maxes[:, 2 + i]
+    for j, name in enumerate(pair_columns):
+        offset = 2 + 2 * n + 6 * j
+        parts[(name, 'n')] = sums[:, offset].astype('int64')
+        for k, stat in enumerate(['sum_x', 'sum_y', 'sumsq_x', 'sumsq_y', 'sum_xy'], start=1):
+            parts[(name, stat)] = sums[:, offset + k]
+
+    table = pd.DataFrame(parts, index=index)
+    table.index.names = by
+    return table
+
+def pair_name(x_col, y_col):
+    return f'{x_col}, {y_col}'
+
+
+# 複数の集計表（または集計表の行）を同じキーでまとめる。maxだけは最大値を取る
+def combine(table, by):
+    max_columns = [c for c in table.columns if c[1] == 'max']
+    other_columns = [c for c in table.columns if c[1] != 'max']
+    grouped = table.groupby(level=by, sort=True, observed=True)
+    merged = pd.concat([grouped[other_columns].sum(), grouped[max_columns].max()], axis=1)
+    return merged[table.columns]
+
+
+# 集計表の平均値
+def mean(table, metric):
+    return table[(metric, 'sum')] / table[(metric, 'n')].replace(0, np.nan)
+
+
+# 推移グラフの時間解像度。日ごとの集計表のほか、週・月ごとの集計表も持っておく
+# 値は区切りの頻度と、1区切りのおおよその日数
+RESOLUTIONS = {'day': (None, 1), 'week': ('W', 7), 'month': ('M', 30.44)}
+ROLLUPS = ['week', 'month']
+# 推移グラフの点の数の上限。日付範囲がこれを超える日数なら週、週でも超えるなら月ごとにする
+TREND_MAX_POINTS = int(os.getenv('TREND_MAX_POINTS', '120'))
+# 移動平均の区切り数と、指数移動平均のスパン（区切り数）
+TREND_ROLLING_WINDOW = int(os.getenv('TREND_ROLLING_WINDOW', '4'))
+TREND_EWM_SPAN = int(os.getenv('TREND_EWM_SPAN', '4'))
+
+
+# 日付を、その日を含む週（月曜始まり）・月の初日にする
+def period_start(dates, resolution):
+    freq, _ = RESOLUTIONS[resolution]
+    dates = pd.DatetimeIndex(dates)
+    return dates if freq is None else dates.to_period(freq).start_time
+
+# 日ごとの集計表を週・月ごとにまとめる（日付は区切りの初日になる）
+def rollup(table, resolution):
+    names = list(table.index.names)
+    levels = [period_start(table.index.get_level_values(n), resolution) if n == '日付' else table.index.get_level_values(n)
+              for n in names]
+    return combine(table.set_axis(pd.MultiIndex.from_arrays(levels, names=names)), names)
+
+# 日付範囲の長さから、点の数がTREND_MAX_POINTS以下になる一番細かい解像度を選ぶ
+def pick_resolution(start, end):
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for resolution, (_, period_days) in RESOLUTIONS.items():
+        if days / period_days <= TREND_MAX_POINTS:
+            return resolution
+    return resolution
+
+# 区切りごとの集計（日付, 球種）から、推移グラフの系列を作る
+# 平均のほか、投球数で重み付けした移動平均（rolling）と、区切りごとの平均の指数移動平均（ewm）を持つ
+def trend_series(periods, metric):
+    summary = pd.DataFrame({
+        metric: mean(periods, metric),
+        'n': periods[(metric, 'n')],
+        'sum': periods[(metric, 'sum')],
+    }).rename_axis(['date', '球種']).reset_index()
+    summary = summary[summary['n'] > 0].sort_values(['球種', 'date'], kind='stable')
+    by_type = summary.groupby('球種', observed=True, sort=False)
+    window = dict(window=TREND_ROLLING_WINDOW, min_periods=1)
+    summary['rolling'] = (by_type['sum'].rolling(**window).sum().droplevel(0)
+                          / by_type['n'].rolling(**window).sum().droplevel(0))
+    summary['ewm'] = by_type[metric].transform(lambda s: s.ewm(span=TREND_EWM_SPAN).mean())
+    return summary.drop(columns=['sum']).sort_values(['date', '球種'], kind='stable').reset_index(drop=True)
+
+# 前処理済みデータ（選手を区別しない）から推移グラフの系列を作る（集計キューブが無いとき用）
+def trend_from_frame(df, metric, resolution=None):
+    daily = combine(aggregate(df, metrics=[metric], pairs=False), ['日付', '球種'])
+    if daily.empty:
+        return trend_series(daily, metric), resolution or 'day'
+    dates = daily.index.get_level_values('日付')
+    resolution = resolution or pick_resolution(dates.min(), dates.max())
+    periods = daily if resolution == 'day' else rollup(daily, resolution)
+    return trend_series(periods, metric), resolution
+
+
+# 集計表から選手と日付範囲の行（日付×球種）を取り出す
+def select_rows(table, name, start_date=None, end_date=None):
+    try:
+        rows = table.xs(name, level='名前')
+    except KeyError:
+        return table.iloc[0:0].droplevel('名前')
+    start = pd.Timestamp(start_date).normalize() if start_date is not None else None
+    end = pd.Timestamp(end_date) if end_date is not None else None
+    dates = rows.index.get_level_values('日付')
+    lo = dates.searchsorted(start, side='left') if start is not None else 0
+    hi = dates.searchsorted(end, side='right') if end is not None else len(rows)
+    return rows.iloc[lo:hi]
+
+
+# 前処理済みデータから作る集計キューブ。中身は書き換えず、追加は新しいキューブを返す
+# 日ごとの集計表（table）と、それを週・月ごとにまとめた表（rollups）を持つ
+class SummaryCube:
+    def __init__(self, table, rollups=None):
+        self.table = table
+        self.rollups = rollups if rollups is not None else {r: rollup(table, r) for r in ROLLUPS}
+
+    # 週・月の表が無い古いキューブ（共有データに残っていたものなど）を読み込んだときは作り直す
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'rollups' not in state:
+            self.rollups = {r: rollup(self.table, r) for r in ROLLUPS}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(aggregate(df))
+
+    # 新しいセッションの行を足し合わせたキューブを返す（週・月の表も新しい行の分だけ足す）
+    def update(self, new_rows):
+        if new_rows.empty:
+            return self
+        new_table = aggregate(new_rows)
+        table = combine(pd.concat([self.table, new_table]), KEYS)
+        rollups = {r: combine(pd.concat([self.rollups[r], rollup(new_table, r)]), KEYS) for r in self.rollups}
+        return SummaryCube(table, rollups)
+
+    # 選手と日付範囲の行（日付×球種）
+    def select(self, name, start_date=None, end_date=None):
+        return select_rows(self.table, name, start_date, end_date)
+
+    # 日付範囲全体を球種ごとにまとめた集計
+    def by_pitch_type(self, name, start_date=None, end_date=None):
+        return combine(self.select(name, start_date, end_date), '球種')
+
+    # 選手×球種ごとの全期間の集計（外れ値の判定に使う各選手の球種ごとの分布）
+    def by_player_pitch_type(self):
+        return combine(self.table, ['名前', '球種'])
+
+    # 推移グラフの系列（trend_series）と、その解像度。解像度を省略すると日付範囲の長さから選ぶ
+    # 範囲にまるごと入る週・月は集計済みの表から取り、範囲の端で一部だけ入る週・月は日ごとの行から作る
+    def trend(self, name, start_date, end_date, metric, resolution=None):
+        daily = self.select(name, start_date, end_date)
+        if resolution is None:
+            if daily.empty:
+                return trend_series(daily, metric), 'day'
+            dates = daily.index.get_level_values('日付')
+            resolution = pick_resolution(start_date if start_date is not None else dates.min(),
+                                         end_date if end_date is not None else dates.max())
+        if resolution == 'day':
+            return trend_series(daily, metric), resolution
+
+        # まるごと範囲に入る区切りの、最初の初日と最後の初日（範囲の端が未指定ならNone）
+        freq, _ = RESOLUTIONS[resolution]
+        first = last = None
+        if start_date is not None:
+            period = pd.Period(pd.Timestamp(start_date), freq)
+            first = period.start_time if period.start_time == pd.Timestamp(start_date).normalize() else (period + 1).start_time
+        if end_date is not None:
+            period = pd.Period(pd.Timestamp(end_date), freq)
+            last = period.start_time if period.end_time.normalize() == pd.Timestamp(end_date).normalize() else (period - 1).start_time
+
+        full = select_rows(self.rollups[resolution], name, first, last)
+        starts = period_start(daily.index.get_level_values('日付'), resolution)
+        partial = np.zeros(len(daily), dtype=bool)
+        if first is not None:
+            partial |= starts < first
+        if last is not None:
+            partial |= starts > last
+        periods = pd.concat([full, rollup(daily[partial], resolution)]) if partial.any() else full
+        return trend_series(periods.sort_index(level=['日付', '球種']), metric), resolution
+
+
+# ---- 平均値テーブル ----
+
+# テーブルの列の定義: (列名, 指標, 集計, 係数, 小数の桁数)
+# 集計は 'count'（投球数）, 'mean', 'max', 'rate'（指標の件数/投球数。ストライク数ならストライク率）
+# 係数は単位の換算など（VAAは0.348倍）。桁数がNoneなら丸めない
+MEAN_TABLE = [
+    ('N', '投球数', 'count', 1, None),
+    ('Velo(Mean)', 'Velocity', 'mean', 1, 1),
+    ('Velo(Max)', 'Velocity', 'max', 1, 1),
+    ('Total_Spin', 'Total Spin', 'mean', 1, 1),
+    ('Spin_Eff', 'Spin Efficiency (release)', 'mean', 1, 1),
+    ('VB(Spin)', 'VB (spin)', 'mean', 1, 1),
+    ('HB(Spin)', 'HB (spin)', 'mean', 1, 1),
+    ('VB(Traj)', 'VB (trajectory)', 'mean', 1, 1),
+    ('HB(Traj)', 'HB (trajectory)', 'mean', 1, 1),
+]
+MEAN_TABLE2 = [
+    ('N', '投球数', 'count', 1, None),
+    ('Release Height[m]', 'Release Height', 'max', 1, 2),
+    ('Release Side[m]', 'Release Side', 'mean', 1, 2),
+    ('Release Angle[°]', 'Release Angle', 'mean', 1, 2),
+    ('Extension[m]', 'Release Extension (ft)', 'mean', 1, 2),
+    ('VAA[°]', 'Vertical Approach Angle', 'mean', 0.348, 1),
+    ('Zone%', 'ストライク数', 'rate', 100, 1),
+]
+
+AGGREGATES = {
+    'count': lambda totals, metric: totals[(metric, '')],
+    'mean': mean,
+    'max': lambda totals, metric: totals[(metric, 'max')],
+    'rate': lambda totals, metric: totals[(metric, '')] / totals[('投球数', '')],
+}
+
+# 定義にある指標（生の投球データから集計するときは、これだけを集計すればよい）
+def spec_metrics(*specs):
+    return list(dict.fromkeys(metric for spec in specs for _, metric, how, _, _ in spec if how in ('mean', 'max')))
+
+# 球種ごとの集計（SummaryCube.by_pitch_type や aggregate(df, by=['球種'])）から、定義どおりの表を作る
+def build_table(totals, spec):
+    columns = {}
+    for label, metric, how, scale, decimals in spec:
+        values = AGGREGATES[how](totals, metric)
+        if scale != 1:
+            values = scale * values
+        columns[label] = values if decimals is None else values.round(decimals)
+    output = pd.DataFrame(columns, index=totals.index).rename_axis('球種').reset_index()
+    output = output.sort_values(by='N', ascending=False)
+    return output
+
+# 球種ごとの平均（散布図の平均マーカーやリリース角度用）
+def pitch_type_means(totals, columns):
+    means = pd.DataFrame({column: mean(totals, column) for column in columns})
+    return means.rename_axis('球種').reset_index()
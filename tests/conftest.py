@@ -0,0 +1,120 @@
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import drive_client
+import synthetic
+
+
+# Drive API（files.get のメタデータと alt=media の範囲指定ダウンロード）のローカルの代役
+# files に {ファイルID: {'meta': メタデータ, 'content': 中身}} を入れて使う
+# fail_metadata / fail_media の回数だけ、最初の要求に fail_status を返す
+class FakeDrive:
+    def __init__(self):
+        self.files = {}
+        self.fail_metadata = 0
+        self.fail_media = 0
+        self.fail_status = 503
+        self.metadata_requests = 0
+        self.media_requests = 0
+        # 受け取った Range ヘッダー（失敗させた要求も含む）
+        self.ranges = []
+        self.lock = threading.Lock()
+
+    def add(self, file_id, content, modified_time='2024-05-01T10:00:00.000Z', md5='md5-1'):
+        self.files[file_id] = {'meta': {'modifiedTime': modified_time, 'md5Checksum': md5}, 'content': content}
+
+
+def _handler(drive):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=()):
+            self.send_response(status)
+            for key, value in headers:
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status):
+            body = json.dumps({'error': {'code': status, 'message': 'fake error'}}).encode()
+            self._send(status, body, [('Content-Type', 'application/json')])
+
+        def do_GET(self):
+            match = re.match(r'^/drive/v3/files/([^/?]+)\?(.*)$', self.path)
+            if match is None:
+                return self._error(404)
+            file_id, query = match.groups()
+            media = 'alt=media' in query.split('&')
+            with drive.lock:
+                if media:
+                    drive.media_requests += 1
+                    drive.ranges.append(self.headers.get('Range'))
+                    failing = drive.fail_media > 0
+                    drive.fail_media -= failing
+                else:
+                    drive.metadata_requests += 1
+                    failing = drive.fail_metadata > 0
+                    drive.fail_metadata -= failing
+            if failing:
+                return self._error(drive.fail_status)
+            entry = drive.files.get(file_id)
+            if entry is None:
+                return self._error(404)
+            if not media:
+                return self._send(200, json.dumps(entry['meta']).encode(), [('Content-Type', 'application/json')])
+
+            content = entry['content']
+            range_match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range') or '')
+            if range_match is None:
+                return self._send(200, content)
+            start, end = int(range_match.group(1)), min(int(range_match.group(2)), len(content) - 1)
+            self._send(206, content[start:end + 1], [('Content-Range', f'bytes {start}-{end}/{len(content)}')])
+    return Handler
+
+
+# ローカルの代役を起動し、drive_client がそこへ接続するようにする（DRIVE_API_ENDPOINT と同じ）
+@pytest.fixture
+def fake_drive(monkeypatch):
+    drive = FakeDrive()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(drive))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    endpoint = f'http://127.0.0.1:{server.server_address[1]}/drive/v3/'
+    monkeypatch.setenv('DRIVE_API_ENDPOINT', endpoint)
+    monkeypatch.setattr(drive_client, 'API_ENDPOINT', endpoint)
+    monkeypatch.delenv('GOOGLE_SERVICE_ACCOUNT_JSON', raising=False)
+    # 認証情報とスレッドごとのサービスは作り直す
+    monkeypatch.setattr(drive_client, '_credentials', None)
+    monkeypatch.setattr(drive_client, '_local', threading.local())
+    # 再試行の待ち時間を0にする（間隔は random() × 2^回数）
+    monkeypatch.setattr('googleapiclient.http.random.random', lambda: 0.0)
+    try:
+        yield drive
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# アプリが読むのと同じ列を持つCSVの中身
+def make_csv(n_rows, seed=0):
+    buffer = io.StringIO()
+    synthetic.make_frame(n_rows, n_players=2, seed=seed).to_csv(buffer, index=False)
+    return buffer.getvalue().encode('utf-8')
+
+def make_gzip(content):
+    return gzip.compress(content)
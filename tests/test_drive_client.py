@@ -0,0 +1,78 @@
+import io
+import os
+
+import pytest
+from googleapiclient.errors import HttpError
+
+import drive_client
+from conftest import make_csv, make_gzip
+
+
+FILE_ID = 'file-1'
+FIELDS = ['modifiedTime', 'md5Checksum']
+
+
+@pytest.mark.parametrize('status', [503, 429])
+def test_metadata_retries_transient_errors(fake_drive, monkeypatch, status):
+    fake_drive.add(FILE_ID, b'')
+    fake_drive.fail_metadata, fake_drive.fail_status = 2, status
+    monkeypatch.setattr(drive_client, 'RETRIES', 3)
+
+    meta = drive_client.get_metadata(drive_client.service(), FILE_ID, FIELDS)
+
+    assert meta == {'modifiedTime': '2024-05-01T10:00:00.000Z', 'md5Checksum': 'md5-1'}
+    assert fake_drive.metadata_requests == 3
+
+def test_metadata_gives_up_after_retries(fake_drive, monkeypatch):
+    fake_drive.add(FILE_ID, b'')
+    fake_drive.fail_metadata = 5
+    monkeypatch.setattr(drive_client, 'RETRIES', 1)
+
+    with pytest.raises(HttpError):
+        drive_client.get_metadata(drive_client.service(), FILE_ID, FIELDS)
+    assert fake_drive.metadata_requests == 2
+
+
+# 範囲指定のチャンクに分けて取り、最初のいくつかが失敗しても同じ中身になる
+@pytest.mark.parametrize('status', [503, 429])
+def test_download_in_ranged_chunks_with_retries(fake_drive, monkeypatch, status):
+    content = os.urandom(10_000)
+    fake_drive.add(FILE_ID, content)
+    fake_drive.fail_media, fake_drive.fail_status = 3, status
+    monkeypatch.setattr(drive_client, 'CHUNK_SIZE', 4096)
+    monkeypatch.setattr(drive_client, 'RETRIES', 3)
+
+    fh = drive_client.download(drive_client.service(), FILE_ID, io.BytesIO())
+
+    assert fh.getvalue() == content
+    # 3チャンク（0-4095, 4096-8191, 8192-）と、1つ目のチャンクの失敗3回
+    assert fake_drive.ranges == ['bytes=0-4095'] * 4 + ['bytes=4096-8191', 'bytes=8192-12287']
+
+def test_download_gives_up_after_retries(fake_drive, monkeypatch):
+    fake_drive.add(FILE_ID, os.urandom(1000))
+    fake_drive.fail_media = 5
+    monkeypatch.setattr(drive_client, 'RETRIES', 1)
+
+    with pytest.raises(HttpError):
+        drive_client.download(drive_client.service(), FILE_ID, io.BytesIO())
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_open_stream_reads_plain_and_gzip(fake_drive, monkeypatch, compressed):
+    content = make_csv(500)
+    fake_drive.add(FILE_ID, make_gzip(content) if compressed else content)
+    fake_drive.fail_media = 2
+    monkeypatch.setattr(drive_client, 'RETRIES', 3)
+
+    with drive_client.open_stream(drive_client.service(), FILE_ID, chunksize=8192, prefetch=1) as stream:
+        assert stream.read() == content
+    assert fake_drive.media_requests > 3
+
+def test_open_stream_raises_download_errors(fake_drive, monkeypatch):
+    fake_drive.add(FILE_ID, os.urandom(1000))
+    fake_drive.fail_media = 5
+    monkeypatch.setattr(drive_client, 'RETRIES', 1)
+
+    # gzipかどうかを見るため、開いた時点で最初のチャンクを取りに行く
+    with pytest.raises(HttpError):
+        drive_client.open_stream(drive_client.service(), FILE_ID).read()
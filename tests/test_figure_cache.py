@@ -0,0 +1,54 @@
+import sys
+import tracemalloc
+
+import figure_cache
+
+
+def make_figure(n):
+    return {'data': [{'type': 'scatter', 'x': list(range(n)), 'y': [i * 0.5 for i in range(n)], 'text': ['ストレート'] * n}],
+            'layout': {'title': {'text': '変化量'}}}
+
+
+# 数えたバイト数が、実際に保持しているJSON文字列の大きさと一致する
+def test_bytes_match_held_text():
+    cache = figure_cache.FigureCache(10 * 1024 * 1024)
+    cache.get_or_build('mov', ('A',), 1, lambda: make_figure(1000))
+    cache.get_or_build('mov', ('B',), 1, lambda: make_figure(2000))
+
+    held = sum(sys.getsizeof(text) for text, _ in cache._entries.values())
+    assert cache.stats()['bytes'] == held
+
+# 上限を決める数字が、キャッシュが保持するメモリに近い（dict/listで持つと数倍になる）
+def test_limit_covers_live_memory():
+    cache = figure_cache.FigureCache(100 * 1024 * 1024)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(10):
+            cache.get_or_build('mov', (i,), 1, lambda: make_figure(5000))
+        live = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert live < cache.stats()['bytes'] * 1.2
+
+def test_hit_returns_fresh_copy():
+    cache = figure_cache.FigureCache(10 * 1024 * 1024)
+    first = cache.get_or_build('mov', ('A',), 1, lambda: make_figure(10))
+    first['layout']['title']['text'] = '書き換え'
+    second = cache.get_or_build('mov', ('A',), 1, lambda: make_figure(0))
+
+    assert second == make_figure(10)
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_evicts_least_recently_used():
+    size = sys.getsizeof(figure_cache.json.dumps(make_figure(1000)))
+    cache = figure_cache.FigureCache(int(size * 2.5))
+    for name in ['A', 'B']:
+        cache.get_or_build('mov', (name,), 1, lambda: make_figure(1000))
+    cache.get_or_build('mov', ('A',), 1, lambda: make_figure(1000))
+    cache.get_or_build('mov', ('C',), 1, lambda: make_figure(1000))
+
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['bytes'] <= stats['max_bytes']
+    cache.get_or_build('mov', ('A',), 1, lambda: make_figure(1000))
+    assert cache.stats()['hits'] == 2
@@ -0,0 +1,31 @@
+import pytest
+
+import functions
+import payload_budget
+import run
+
+
+COLOR_MAP = functions.set_palette()
+BUILDERS = dict(run.builders(functions, COLOR_MAP))
+_frames = {}
+
+
+def player_frame(size):
+    if size not in _frames:
+        _frames[size] = payload_budget.make_player_frame(size)
+    return _frames[size]
+
+
+# 図表ごとに、ブラウザに送るJSONとgzip後の大きさがbenchmarks/payload_budget.jsonの上限以内か
+# 上限を変えるときは python benchmarks/payload_budget.py --update
+@pytest.mark.parametrize('size', payload_budget.SIZES)
+@pytest.mark.parametrize('name', list(BUILDERS))
+def test_payload_within_budget(size, name):
+    key = f'{size}/{name}'
+    budget = payload_budget.load_budget()
+    assert key in budget, f'{key} の上限がありません'
+
+    sizes = payload_budget.measure(BUILDERS[name], player_frame(size))
+
+    for kind in ('json', 'gzip'):
+        assert sizes[kind] <= budget[key][kind], f'{key} の{kind}が上限を超えています: {sizes[kind]} > {budget[key][kind]}'
@@ -0,0 +1,92 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+from googleapiclient.errors import HttpError
+
+import drive_client
+import import_data
+import schema
+from conftest import make_csv
+
+
+FILE_ID = 'file-1'
+
+
+@pytest.fixture(autouse=True)
+def retries(monkeypatch):
+    monkeypatch.setattr(drive_client, 'RETRIES', 0)
+
+
+def read_meta(cache_dir):
+    _, meta_path = import_data.snapshot_paths(FILE_ID, str(cache_dir))
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# スナップショットがDriveのメタデータと一致すれば、ダウンロードせずにそれを使う
+def test_fresh_snapshot_is_reused(fake_drive, tmp_path):
+    fake_drive.add(FILE_ID, make_csv(300, seed=1))
+    snapshot = schema.read_csv(io.BytesIO(make_csv(100, seed=2)))
+    import_data.save_snapshot(FILE_ID, snapshot, fake_drive.files[FILE_ID]['meta'], str(tmp_path))
+
+    df, version = import_data.load_dataset(FILE_ID, cache_dir=str(tmp_path))
+
+    pd.testing.assert_frame_equal(df, snapshot)
+    assert version == import_data.data_version(fake_drive.files[FILE_ID]['meta'])
+    assert fake_drive.metadata_requests == 1
+    assert fake_drive.media_requests == 0
+
+def test_unchanged_version_returns_none(fake_drive, tmp_path):
+    fake_drive.add(FILE_ID, make_csv(100))
+    version = import_data.data_version(fake_drive.files[FILE_ID]['meta'])
+
+    assert import_data.load_dataset(FILE_ID, known_version=version, cache_dir=str(tmp_path)) is None
+    assert fake_drive.media_requests == 0
+
+
+# 更新日時かチェックサムが変われば、ダウンロードし直してスナップショットを書き換える
+@pytest.mark.parametrize('changed', [
+    {'modifiedTime': '2024-06-01T10:00:00.000Z'},
+    {'md5Checksum': 'md5-2'},
+])
+def test_changed_metadata_downloads_and_rewrites_snapshot(fake_drive, tmp_path, changed):
+    content = make_csv(300, seed=1)
+    fake_drive.add(FILE_ID, content)
+    old = schema.read_csv(io.BytesIO(make_csv(100, seed=2)))
+    import_data.save_snapshot(FILE_ID, old, fake_drive.files[FILE_ID]['meta'], str(tmp_path))
+    fake_drive.files[FILE_ID]['meta'].update(changed)
+
+    df, version = import_data.load_dataset(FILE_ID, cache_dir=str(tmp_path))
+
+    expected = schema.read_csv(io.BytesIO(content))
+    pd.testing.assert_frame_equal(df, expected)
+    assert version == import_data.data_version(fake_drive.files[FILE_ID]['meta'])
+    assert fake_drive.media_requests >= 1
+    assert read_meta(tmp_path) == fake_drive.files[FILE_ID]['meta']
+    snapshot, _ = import_data.load_snapshot(FILE_ID, str(tmp_path))
+    pd.testing.assert_frame_equal(snapshot, expected)
+
+
+# メタデータを取れなければスナップショットで起動し、スナップショットも無ければエラーにする
+def test_metadata_failure_falls_back_to_snapshot(fake_drive, tmp_path):
+    fake_drive.add(FILE_ID, make_csv(300, seed=1))
+    snapshot = schema.read_csv(io.BytesIO(make_csv(100, seed=2)))
+    meta = dict(fake_drive.files[FILE_ID]['meta'])
+    import_data.save_snapshot(FILE_ID, snapshot, meta, str(tmp_path))
+    fake_drive.fail_metadata = 1
+
+    df, version = import_data.load_dataset(FILE_ID, cache_dir=str(tmp_path))
+
+    pd.testing.assert_frame_equal(df, snapshot)
+    assert version == import_data.data_version(meta)
+    assert fake_drive.media_requests == 0
+
+def test_metadata_failure_without_snapshot_raises(fake_drive, tmp_path):
+    fake_drive.add(FILE_ID, make_csv(100))
+    fake_drive.fail_metadata = 1
+
+    with pytest.raises(HttpError):
+        import_data.load_dataset(FILE_ID, cache_dir=str(tmp_path))
+    assert fake_drive.media_requests == 0